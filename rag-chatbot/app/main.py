@@ -5,20 +5,24 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 from app.services.graph_service_v2 import GraphServiceV2
-from app.services.vector_search import VectorSearchService
+from app.services.vector_search import UnknownFilterError, VectorSearchService
 from app.services.embedding_service import EmbeddingService
 from app.services.llm_service import LLMService
 from app.services.rag_service_v2 import RAGServiceV2
+from app.services.index_reloader import IndexReloader
+from app.services.embedding_store import default_index_dir
 from app.models.schemas import (
     ChatRequest,
     ChatResponse,
     SourceInfo,
     EntityRequest,
     EntityResponse,
-    HealthResponse
+    HealthResponse,
+    ReloadResponse
 )
 
 # Load environment variables
@@ -49,12 +53,15 @@ app.add_middleware(
 
 # Global services (initialized on startup)
 rag_service: RAGServiceV2 = None
+vector_search: VectorSearchService = None
+index_reloader: IndexReloader = None
+embedding_service: EmbeddingService = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on application startup."""
-    global rag_service
+    global rag_service, vector_search, index_reloader, embedding_service
 
     logger.info("Starting RAG Chatbot API...")
 
@@ -70,13 +77,40 @@ async def startup_event():
 
     # Initialize services (using V2 with chunk support)
     logger.info("Initializing Graph Service V2 (with chunks)...")
-    graph_service = GraphServiceV2(graph_path, schema_path)
-
-    logger.info("Initializing Vector Search Service...")
-    vector_search = VectorSearchService(embeddings_path)
+    # chunk_groups.json is written into the index directory by build_vector_index.py --dedup-chunks
+    index_dir = Path(embeddings_path) if Path(embeddings_path).is_dir() else default_index_dir(embeddings_path)
+    graph_service = GraphServiceV2(graph_path, schema_path, chunk_groups_path=str(index_dir))
 
     logger.info("Initializing Embedding Service...")
-    embedding_service = EmbeddingService()
+    embedding_service = EmbeddingService(
+        model_name=os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"),
+        query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+        query_cache_ttl=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600")),
+        embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+        batch_size=int(os.getenv("EMBED_BATCH_SIZE", "32")),
+        batch_wait_ms=float(os.getenv("EMBED_BATCH_WAIT_MS", "5")),
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        onnx_dir=os.getenv("EMBEDDING_ONNX_DIR") or None,
+        token_budget=int(os.getenv("EMBED_TOKEN_BUDGET", "8192")),
+        matryoshka_dim=int(os.getenv("MATRYOSHKA_DIM") or 0) or None
+    )
+
+    logger.info("Initializing Vector Search Service...")
+    vector_search = VectorSearchService(
+        embeddings_path,
+        # A Matryoshka prefix scan replaces VECTOR_QUANTIZATION as the first pass
+        quantization=embedding_service.search_quantization or os.getenv("VECTOR_QUANTIZATION") or None,
+        rescore_factor=int(os.getenv("VECTOR_RESCORE_FACTOR", "4")),
+        index_type=os.getenv("VECTOR_INDEX", "flat"),
+        nprobe=int(os.getenv("VECTOR_NPROBE", "8")),
+        ef_search=int(os.getenv("VECTOR_EF_SEARCH", "64")),
+        shards=int(os.getenv("VECTOR_SHARDS", "0"))
+    )
+    # Attach segments appended by ingestion and compact in the background
+    vector_search.start_maintenance(
+        interval=float(os.getenv("VECTOR_REFRESH_SECONDS", "5")),
+        max_segments=int(os.getenv("VECTOR_MAX_SEGMENTS", "8"))
+    )
 
     logger.info("Initializing LLM Service...")
     llm_service = LLMService(anthropic_api_key)
@@ -89,9 +123,26 @@ async def startup_event():
         llm_service=llm_service
     )
 
+    # Reload graph + vector index in the background when graph.json changes
+    index_reloader = IndexReloader(rag_service, graph_path, schema_path, chunk_groups_path=str(index_dir))
+    reload_interval = float(os.getenv("GRAPH_RELOAD_SECONDS", "30"))
+    if reload_interval > 0:
+        index_reloader.start(reload_interval)
+
     logger.info("✅ All services initialized successfully!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background reloads, index maintenance and search shards."""
+    if index_reloader is not None:
+        index_reloader.stop()
+    if vector_search is not None:
+        vector_search.close()
+    if embedding_service is not None:
+        embedding_service.close()
+
+
 @app.get("/", response_model=HealthResponse)
 async def root():
     """Root endpoint - health check."""
@@ -123,10 +174,13 @@ async def health_check():
 
 
 @app.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
-async def chat(request: ChatRequest):
+def chat(request: ChatRequest):
     """
     Main chat endpoint - answer questions using RAG pipeline.
 
+    Runs in the threadpool, so concurrent requests overlap and their query
+    embeddings are micro-batched.
+
     Args:
         request: ChatRequest with query and parameters
 
@@ -144,7 +198,11 @@ async def chat(request: ChatRequest):
             entity_weight=request.entity_weight,
             chunk_weight=request.chunk_weight,
             include_relationships=request.include_relationships,
+            relationship_depth=request.relationship_depth,
             min_similarity=request.min_similarity,
+            ef_search=request.ef_search,
+            filters=request.filters,
+            mmr_lambda=request.mmr_lambda,
             debug=request.debug
         )
 
@@ -159,11 +217,31 @@ async def chat(request: ChatRequest):
 
         return response
 
+    except UnknownFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing chat request: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
 
+@app.post("/admin/reload", response_model=ReloadResponse)
+def reload_index():
+    """
+    Load graph.json / embeddings into a new generation and swap it in.
+
+    Runs in the threadpool; /chat requests keep being served from the current
+    generation until the swap.
+    """
+    if index_reloader is None:
+        raise HTTPException(status_code=503, detail="Services not initialized")
+
+    try:
+        return ReloadResponse(**index_reloader.reload())
+    except Exception as e:
+        logger.error(f"Error reloading index: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous generation: {str(e)}")
+
+
 @app.post("/entity", response_model=EntityResponse)
 async def get_entity(request: EntityRequest):
     """
@@ -2,7 +2,7 @@
 Pydantic models for API requests and responses
 """
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Union
 
 
 class ChatRequest(BaseModel):
@@ -12,9 +12,29 @@ class ChatRequest(BaseModel):
     entity_weight: float = Field(default=1.0, description="Weight for entity results (0.5-2.0)", ge=0.1, le=2.0)
     chunk_weight: float = Field(default=1.0, description="Weight for chunk results (0.5-2.0)", ge=0.1, le=2.0)
     include_relationships: bool = Field(default=True, description="Include entity relationships in context")
+    relationship_depth: int = Field(default=1, description="Hops traversed around retrieved entities for relationship context", ge=1, le=3)
     min_similarity: float = Field(default=0.05, description="Minimum similarity threshold", ge=0.0, le=1.0)
+    ef_search: Optional[int] = Field(default=None, description="HNSW search breadth (higher = better recall, slower)", ge=1, le=1000)
+    filters: Optional[Dict[str, Union[str, List[str]]]] = Field(
+        default=None,
+        description="Restrict retrieval by metadata: node_type, entity_type, source_file, country "
+                    "(chunks match every location they mention) "
+                    "(e.g. {\"entity_type\": \"company\", \"source_file\": \"Toys_and_Games_in_Asia_Pacific\"})"
+    )
+    mmr_lambda: Optional[float] = Field(
+        default=None,
+        alias="lambda",
+        description="Enable MMR result selection: 1.0 = pure relevance, lower values favour diverse "
+                    "(less overlapping) chunks and shorter prompts",
+        ge=0.0,
+        le=1.0
+    )
     debug: bool = Field(default=False, description="Include debug information in response")
 
+    class Config:
+        # 'lambda' is a Python keyword: accept both the alias and the field name
+        populate_by_name = True
+
 
 class SourceInfo(BaseModel):
     """Information about a source (entity or document chunk)."""
@@ -31,6 +51,7 @@ class SourceInfo(BaseModel):
     chunk_id: Optional[str] = None
     source_file: Optional[str] = None
     chunk_index: Optional[int] = None
+    duplicate_sources: Optional[List[str]] = None  # Near-duplicate chunks collapsed into this one
     text_preview: Optional[str] = None
     mentioned_entities: Optional[List[str]] = None
 
@@ -68,3 +89,12 @@ class HealthResponse(BaseModel):
     status: str
     version: str
     services: Dict[str, str]
+
+
+class ReloadResponse(BaseModel):
+    """Response model for index reload."""
+    generation: int
+    entities: int
+    chunks: int
+    embeddings: int
+    seconds: float
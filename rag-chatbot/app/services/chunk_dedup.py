@@ -0,0 +1,132 @@
+"""
+Chunk Dedup: Index-time collapsing of near-duplicate chunk embeddings
+
+Reports for different countries often repeat the same boilerplate sections.
+Chunks whose embeddings are more similar than a threshold are grouped; each
+group keeps a single representative row in the vector index (the normalized
+mean of its members, stored under the first member's hash) and a list of
+pointers to every member chunk and its source location.
+
+The groups are written to chunk_groups.json in the index directory, so
+GraphServiceV2 can map search hits on a representative back to all members.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+import logging
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+CHUNK_GROUPS_FILE = "chunk_groups.json"
+
+# Rows compared against all chunks per matrix product
+DEDUP_BLOCK_ROWS = 1024
+
+
+def find_duplicate_groups(vectors: np.ndarray, threshold: float = 0.95) -> List[List[int]]:
+    """
+    Leader clustering: in row order, every unassigned row becomes a leader and
+    absorbs the unassigned rows at cosine similarity >= threshold.
+
+    Args:
+        vectors: Unit-normalized vectors, shape (N, D)
+        threshold: Minimum cosine similarity to the leader
+
+    Returns:
+        Groups of row indices with more than one member (leader first)
+    """
+    assigned = np.zeros(len(vectors), dtype=bool)
+    groups = []
+
+    for start in range(0, len(vectors), DEDUP_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + DEDUP_BLOCK_ROWS], dtype=np.float32)
+        similarities = block @ np.asarray(vectors, dtype=np.float32).T
+
+        for offset, row_similarities in enumerate(similarities):
+            leader = start + offset
+            if assigned[leader]:
+                continue
+            assigned[leader] = True
+
+            members = np.flatnonzero((row_similarities >= threshold) & ~assigned)
+            if len(members):
+                assigned[members] = True
+                groups.append([leader] + members.tolist())
+
+    return groups
+
+
+def collapse_chunk_duplicates(
+    store: EmbeddingStore,
+    chunks: List[Dict],
+    threshold: float = 0.95
+):
+    """
+    Collapse near-duplicate chunk rows of a store.
+
+    Args:
+        store: Full embedding store (entities and chunks)
+        chunks: Chunk nodes from graph.json (with embedding_hash)
+        threshold: Minimum cosine similarity for two chunks to be merged
+
+    Returns:
+        (collapsed store, representative hash -> member pointers)
+    """
+    chunks = [c for c in chunks if c.get('embedding_hash')]
+    rows = store.rows_for_hashes([c['embedding_hash'] for c in chunks])
+    chunks = [c for c, row in zip(chunks, rows) if row >= 0]
+    rows = rows[rows >= 0]
+
+    groups = find_duplicate_groups(store.vectors[rows], threshold)
+
+    vectors = np.array(store.vectors, dtype=np.float32)
+    norms = np.array(store.norms, dtype=np.float32)
+    keep = np.ones(len(store), dtype=bool)
+    chunk_groups: Dict[str, List[Dict]] = {}
+
+    for group in groups:
+        group_rows = rows[group]
+        leader_row = group_rows[0]
+
+        # Representative: normalized mean of the members, under the leader's hash
+        centroid = vectors[group_rows].mean(axis=0)
+        vectors[leader_row] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        norms[leader_row] = norms[group_rows].mean()
+        keep[group_rows[1:]] = False
+
+        chunk_groups[chunks[group[0]]['embedding_hash']] = [
+            {
+                'chunk_id': chunks[i]['id'],
+                'embedding_hash': chunks[i]['embedding_hash'],
+                'source_file': chunks[i].get('source_file'),
+                'chunk_index': chunks[i].get('chunk_index')
+            }
+            for i in group
+        ]
+
+    collapsed = EmbeddingStore(np.asarray(store.hashes)[keep], vectors[keep], norms[keep])
+    logger.info(
+        f"Collapsed {int((~keep).sum())} near-duplicate chunks into {len(groups)} groups "
+        f"(threshold {threshold}): {len(store)} -> {len(collapsed)} rows"
+    )
+    return collapsed, chunk_groups
+
+
+def save_chunk_groups(index_dir: Union[str, Path], chunk_groups: Dict[str, List[Dict]]):
+    with open(Path(index_dir) / CHUNK_GROUPS_FILE, 'w') as f:
+        json.dump(chunk_groups, f, indent=2)
+
+
+def load_chunk_groups(path: Union[str, Path]) -> Dict[str, List[Dict]]:
+    """Representative hash -> member pointers (empty if the file does not exist)."""
+    path = Path(path)
+    if path.is_dir():
+        path = path / CHUNK_GROUPS_FILE
+    if not path.exists():
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
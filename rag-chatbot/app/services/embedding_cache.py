@@ -0,0 +1,147 @@
+"""
+Embedding Cache: Persistent content-addressed embedding store (SQLite)
+
+Every embedding is stored under sha256(model name + text), so ingestion and
+serving share one cache: re-running add_document_chunks.py, or re-embedding
+labels after a graph rebuild, only encodes texts the model has never seen.
+
+Vectors are stored as raw float32 blobs in a single SQLite table (WAL mode),
+which can be appended to concurrently by the API and by ingestion scripts.
+"""
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default location, next to the ontology output
+DEFAULT_CACHE_PATH = '../output/ontology/.cache/embeddings.sqlite'
+
+# Keys per SELECT ... IN (...) statement (SQLite's host-parameter limit)
+LOOKUP_BATCH = 500
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content address of an embedding: sha256 of the model name and the text."""
+    # 'all-mpnet-base-v2' and 'sentence-transformers/all-mpnet-base-v2' are the same model
+    model_name = model_name.rsplit('/', 1)[-1]
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed text -> embedding cache for one model."""
+
+    def __init__(self, path: Union[str, Path], model_name: str):
+        """
+        Open (or create) a cache database.
+
+        Args:
+            path: SQLite database file
+            model_name: Embedding model; part of every key
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"Opened embedding cache: {self.path} ({len(self)} vectors)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            One float32 vector per text, None where the text is not cached
+        """
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            results = [found.get(key) for key in keys]
+            hits = sum(vector is not None for vector in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+
+        return results
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray):
+        """Store embeddings (existing keys are overwritten)."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        rows = [
+            (cache_key(self.model_name, text), embedding.shape[0], embedding.tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def get_or_compute(
+        self,
+        texts: Sequence[str],
+        compute: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Embeddings for texts, computing and storing only the uncached ones.
+
+        Args:
+            texts: Texts to embed
+            compute: Encoder called once with the unique uncached texts
+
+        Returns:
+            Float32 array of shape (len(texts), dim)
+        """
+        cached = self.get_many(texts)
+
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            computed = np.asarray(compute(missing), dtype=np.float32)
+            self.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+            cached = [by_text[text] if vector is None else vector for text, vector in zip(texts, cached)]
+
+        if not cached:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(cached)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters of this process."""
+        return {'path': str(self.path), 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,27 +1,112 @@
 """
 Embedding Service: Generate embeddings using sentence-transformers
+
+The model runs on PyTorch by default; backend='onnx' / 'onnx-int8' runs an
+export written by scripts/export_onnx_encoder.py on onnxruntime instead.
 """
 from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import Dict, List, Optional
 import logging
 import numpy as np
 
+from app.services.embedding_cache import EmbeddingCache
+from app.services.length_batching import encode_bucketed, token_lengths
+from app.services.matryoshka import prefix_mode
+from app.services.onnx_encoder import OnnxEncoder
+from app.services.query_batcher import QueryBatcher
+from app.services.query_cache import QueryEmbeddingCache
+
 logger = logging.getLogger(__name__)
 
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
 
 class EmbeddingService:
     """Service for generating text embeddings using sentence-transformers."""
 
-    def __init__(self, model_name: str = "sentence-transformers/all-mpnet-base-v2"):
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-mpnet-base-v2",
+        query_cache_size: int = 1024,
+        query_cache_ttl: float = 3600.0,
+        embedding_cache_path: Optional[str] = None,
+        batch_size: int = 32,
+        batch_wait_ms: float = 5.0,
+        backend: str = "torch",
+        onnx_dir: Optional[str] = None,
+        token_budget: int = 8192,
+        matryoshka_dim: Optional[int] = None
+    ):
         """
         Initialize the embedding service.
 
         Args:
-            model_name: The sentence-transformer model to use (768 dimensions)
+            model_name: The sentence-transformer model to use (all-mpnet-base-v2: 768 dimensions)
+            query_cache_size: Query embeddings kept in the LRU cache (0 disables it)
+            query_cache_ttl: Seconds a cached query embedding stays valid (0 = no expiry)
+            embedding_cache_path: SQLite embedding cache shared with ingestion (optional)
+            batch_size: Maximum concurrent queries encoded together
+            batch_wait_ms: Window for collecting concurrent queries (0 disables batching)
+            backend: 'torch', 'onnx' (float32 export) or 'onnx-int8' (quantized export)
+            onnx_dir: Export directory written by scripts/export_onnx_encoder.py
+            token_budget: Padded tokens per length-sorted batch in embed_batch (0 = model default batching)
+            matryoshka_dim: Prefix dimensions for the first-pass scan (Matryoshka-trained models only)
         """
-        logger.info(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        logger.info("Embedding model loaded successfully")
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend} (expected one of {EMBEDDING_BACKENDS})")
+
+        if backend == 'torch':
+            logger.info(f"Loading embedding model: {model_name}")
+            self.model = SentenceTransformer(model_name)
+        else:
+            if not onnx_dir:
+                raise ValueError(f"Embedding backend {backend} needs an ONNX export directory")
+            logger.info(f"Loading ONNX embedding model ({backend}): {onnx_dir}")
+            self.model = OnnxEncoder(onnx_dir, quantized=backend == 'onnx-int8')
+        self.model_name = model_name
+        self.backend = backend
+        self.token_budget = token_budget
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        logger.info(f"Embedding model loaded successfully ({self.dimension} dimensions)")
+
+        if matryoshka_dim is not None and not 0 < matryoshka_dim < self.dimension:
+            raise ValueError(f"Matryoshka prefix must be between 1 and {self.dimension - 1} dimensions, got {matryoshka_dim}")
+        self.matryoshka_dim = matryoshka_dim
+
+        self.query_cache = QueryEmbeddingCache(query_cache_size, query_cache_ttl)
+        # int8 embeddings are close to, but not the same as, the float32 ones
+        cache_model = f"{model_name}@int8" if backend == 'onnx-int8' else model_name
+        self.embedding_cache = EmbeddingCache(embedding_cache_path, cache_model) if embedding_cache_path else None
+
+        # Concurrent embed_query calls share one model.encode call
+        self.batcher = QueryBatcher(self._encode, batch_size, batch_wait_ms) if batch_wait_ms > 0 else None
+
+    def _encode_model(self, texts: List[str], **kwargs) -> np.ndarray:
+        """Run the model, in length-sorted batches within the token budget when configured."""
+        if self.token_budget <= 0 or len(texts) <= 1:
+            return self.model.encode(texts, convert_to_numpy=True, **kwargs)
+
+        kwargs.pop('show_progress_bar', None)
+        return encode_bucketed(
+            lambda batch: self.model.encode(batch, batch_size=len(batch), convert_to_numpy=True, **kwargs),
+            texts,
+            token_lengths(self.model, texts),
+            self.token_budget
+        )
+
+    def _encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        """Encode texts, going through the persistent cache when configured."""
+        if self.embedding_cache is None:
+            return self._encode_model(texts, **kwargs)
+        return self.embedding_cache.get_or_compute(
+            texts,
+            lambda missing: self._encode_model(missing, **kwargs)
+        )
+
+    @property
+    def search_quantization(self) -> Optional[str]:
+        """Coarse-scan mode for VectorSearchService implied by the prefix size, if any."""
+        return prefix_mode(self.matryoshka_dim) if self.matryoshka_dim else None
 
     def embed_query(self, text: str) -> np.ndarray:
         """
@@ -31,11 +116,35 @@ class EmbeddingService:
             text: Query text to embed
 
         Returns:
-            Numpy array of shape (768,)
+            Numpy array of shape (768,) (read-only when served from the cache)
         """
-        embedding = self.model.encode(text, convert_to_numpy=True)
+        embedding = self.query_cache.get(text)
+        if embedding is not None:
+            return embedding
+
+        if self.batcher is not None:
+            embedding = self.batcher.submit(text).result()
+        else:
+            embedding = self._encode([text])[0]
+        self.query_cache.put(text, embedding)
         return embedding
 
+    def cache_stats(self) -> Dict:
+        """Query cache / persistent cache hit-miss counters and batch sizes."""
+        stats = self.query_cache.stats()
+        if self.embedding_cache is not None:
+            stats['persistent'] = self.embedding_cache.stats()
+        if self.batcher is not None:
+            stats['batching'] = self.batcher.stats()
+        return stats
+
+    def close(self):
+        """Stop the batching thread and close the persistent cache."""
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+
     def embed_batch(self, texts: List[str]) -> np.ndarray:
         """
         Generate embeddings for multiple texts.
@@ -46,5 +155,5 @@ class EmbeddingService:
         Returns:
             Numpy array of shape (num_texts, 768)
         """
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+        embeddings = self._encode(texts, show_progress_bar=True)
         return embeddings
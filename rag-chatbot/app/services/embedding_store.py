@@ -0,0 +1,291 @@
+"""
+Embedding Store: Binary, memory-mapped storage for embedding vectors
+
+The JSON embeddings file (hash -> list of floats) is easy to produce but has to
+be parsed in full on every start-up. This module converts it into a directory
+of NumPy files that are opened with np.memmap, so loading is close to constant
+time and the OS page cache is shared between worker processes.
+
+Index directory layout:
+    vectors.npy   float32 (N, D) unit-normalized embeddings (row id = position)
+    norms.npy     float32 (N,) original L2 norm of each row
+    hashes.npy    unicode (N,) embedding hash of each row
+    hash_index.npy  int64 (N,) row ids ordered by hash, for binary-search lookups
+
+Structures derived from the rows (quantized codes, IVF and HNSW indexes) are
+stored next to them. fingerprints.json records the fingerprint of the rows each
+one was built from, so a structure left over from other vectors is rebuilt
+instead of being searched.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+VECTORS_FILE = "vectors.npy"
+NORMS_FILE = "norms.npy"
+HASHES_FILE = "hashes.npy"
+HASH_INDEX_FILE = "hash_index.npy"
+FINGERPRINTS_FILE = "fingerprints.json"
+
+# Files built from the rows, removed whenever the rows are rewritten
+DERIVED_PATTERNS = ("codes_*", "quantizer_*", "pq_*", "ivf.npz", "hnsw.*", FINGERPRINTS_FILE)
+
+# Vectors sampled into a fingerprint (every hash is included)
+FINGERPRINT_SAMPLE_ROWS = 1024
+
+
+def default_index_dir(embeddings_path: PathLike) -> Path:
+    """Binary index directory that sits next to an embeddings.json file."""
+    return Path(embeddings_path).with_suffix('.index')
+
+
+def _atomic_save(path: Path, array: np.ndarray):
+    """Write a .npy file via a temporary file so readers never see a partial file."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingStore:
+    """Row-aligned hashes, unit-normalized float32 vectors and their norms."""
+
+    def __init__(
+        self,
+        hashes: np.ndarray,
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        hash_index: np.ndarray = None,
+        index_dir: PathLike = None
+    ):
+        """
+        Initialize embedding store.
+
+        Args:
+            hashes: Array of embedding hashes, shape (N,)
+            vectors: Unit-normalized vectors, shape (N, D)
+            norms: Original L2 norms, shape (N,)
+            hash_index: Row ids sorted by hash (computed when not given)
+            index_dir: Binary index directory the store was loaded from (None for JSON)
+        """
+        self.hashes = hashes
+        self.vectors = vectors
+        self.norms = norms
+        self.index_dir = Path(index_dir) if index_dir else None
+
+        # Sorted-array index: hash -> row id by binary search
+        if hash_index is None:
+            hash_index = np.argsort(hashes, kind='stable')
+        self.hash_index = hash_index
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def dim(self) -> int:
+        """Embedding dimension."""
+        return self.vectors.shape[1]
+
+    @classmethod
+    def from_arrays(cls, hashes: List[str], matrix: np.ndarray) -> 'EmbeddingStore':
+        """Build a store from hashes and a matrix of raw (unnormalized) embeddings."""
+        hashes = np.array(list(hashes), dtype=str)
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(hashes), -1)
+
+        norms = np.linalg.norm(matrix, axis=1)
+        safe_norms = np.where(norms > 0, norms, 1.0).astype(np.float32)
+        vectors = matrix / safe_norms[:, None]
+
+        return cls(hashes, vectors, norms.astype(np.float32))
+
+    @classmethod
+    def from_dict(cls, embeddings: Dict[str, List[float]]) -> 'EmbeddingStore':
+        """Build a store from a hash -> vector mapping."""
+        return cls.from_arrays(
+            embeddings.keys(),
+            np.array([embeddings[h] for h in embeddings], dtype=np.float32)
+        )
+
+    @classmethod
+    def concatenate(cls, stores: List['EmbeddingStore'], rows: List[np.ndarray]) -> 'EmbeddingStore':
+        """
+        Build one in-memory store from selected rows of several stores.
+
+        Args:
+            stores: Source stores
+            rows: Row ids to take from each store
+        """
+        return cls(
+            np.concatenate([np.asarray(s.hashes[r]) for s, r in zip(stores, rows)]),
+            np.concatenate([np.asarray(s.vectors[r]) for s, r in zip(stores, rows)]),
+            np.concatenate([np.asarray(s.norms[r]) for s, r in zip(stores, rows)])
+        )
+
+    @classmethod
+    def from_json(cls, json_path: PathLike) -> 'EmbeddingStore':
+        """Build a store by parsing an embeddings.json file."""
+        with open(json_path, 'r') as f:
+            embeddings_data = json.load(f)
+        return cls.from_dict(embeddings_data)
+
+    @classmethod
+    def load(cls, index_dir: PathLike, mmap: bool = True) -> 'EmbeddingStore':
+        """
+        Open a binary index directory.
+
+        Args:
+            index_dir: Directory written by save()
+            mmap: Memory-map the arrays instead of reading them into RAM
+
+        Returns:
+            EmbeddingStore backed by read-only memory maps
+        """
+        index_dir = Path(index_dir)
+        mmap_mode = 'r' if mmap else None
+
+        hashes = np.load(index_dir / HASHES_FILE, mmap_mode=mmap_mode)
+        vectors = np.load(index_dir / VECTORS_FILE, mmap_mode=mmap_mode)
+        norms = np.load(index_dir / NORMS_FILE, mmap_mode=mmap_mode)
+
+        # Older index directories have no persisted hash index
+        hash_index = None
+        if (index_dir / HASH_INDEX_FILE).exists():
+            hash_index = np.load(index_dir / HASH_INDEX_FILE)
+
+        return cls(hashes, vectors, norms, hash_index, index_dir)
+
+    def save(self, index_dir: PathLike):
+        """Write the store as a binary index directory."""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+
+        _atomic_save(index_dir / VECTORS_FILE, np.ascontiguousarray(self.vectors, dtype=np.float32))
+        _atomic_save(index_dir / NORMS_FILE, np.asarray(self.norms, dtype=np.float32))
+        _atomic_save(index_dir / HASH_INDEX_FILE, np.asarray(self.hash_index, dtype=np.int64))
+        # Hashes last: a complete hashes.npy marks the directory as usable
+        _atomic_save(index_dir / HASHES_FILE, np.asarray(self.hashes, dtype=str))
+
+    def fingerprint(self, num_rows: int = None) -> str:
+        """
+        Content fingerprint of the first num_rows rows (default: all).
+
+        Covers every hash plus an evenly spaced sample of vectors, so vectors
+        re-embedded under the same hashes change it as well.
+        """
+        num_rows = len(self) if num_rows is None else num_rows
+        sample = np.unique(np.linspace(0, num_rows - 1, min(num_rows, FINGERPRINT_SAMPLE_ROWS)).astype(np.int64))
+
+        digest = hashlib.sha1(f"{num_rows}:{self.dim}".encode())
+        digest.update('\n'.join(map(str, self.hashes[:num_rows])).encode())
+        digest.update(np.ascontiguousarray(self.vectors[sample], dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def rows_for_hashes(self, hashes: List[str]) -> np.ndarray:
+        """
+        Look up row ids for many hashes at once.
+
+        Args:
+            hashes: Embedding hashes
+
+        Returns:
+            int64 array of row ids, -1 where a hash is unknown
+        """
+        hashes = np.asarray(hashes, dtype=str)
+        if len(self.hash_index) == 0:
+            return np.full(len(hashes), -1, dtype=np.int64)
+
+        # Binary search through the sorter permutation (no sorted copy kept)
+        positions = np.searchsorted(self.hashes, hashes, sorter=self.hash_index)
+        positions = np.minimum(positions, len(self.hash_index) - 1)
+        rows = np.asarray(self.hash_index[positions], dtype=np.int64)
+        found = self.hashes[rows] == hashes
+
+        return np.where(found, rows, -1)
+
+    def row_for_hash(self, text_hash: str) -> int:
+        """Look up the row id of a hash (-1 if unknown)."""
+        return int(self.rows_for_hashes([text_hash])[0])
+
+    def raw_vector(self, row: int) -> np.ndarray:
+        """Get the embedding at its original scale."""
+        return np.asarray(self.vectors[row]) * self.norms[row]
+
+    def raw_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Get several embeddings at their original scale, shape (len(rows), D)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.asarray(self.vectors[rows]) * np.asarray(self.norms[rows])[:, None]
+
+
+def convert_json_to_binary(json_path: PathLike, index_dir: PathLike = None) -> Path:
+    """
+    Convert an embeddings.json file into a binary index directory.
+
+    Args:
+        json_path: Path to embeddings.json
+        index_dir: Output directory (defaults to embeddings.index next to the JSON)
+
+    Returns:
+        Path of the written index directory
+    """
+    index_dir = Path(index_dir) if index_dir else default_index_dir(json_path)
+
+    logger.info(f"Converting {json_path} -> {index_dir}")
+    store = EmbeddingStore.from_json(json_path)
+    if index_dir.exists():
+        remove_derived_files(index_dir)
+    store.save(index_dir)
+    logger.info(f"Wrote {len(store)} vectors with dimension {store.dim}")
+
+    return index_dir
+
+
+def read_fingerprint(index_dir: PathLike, name: str) -> Optional[str]:
+    """Fingerprint of the rows a derived structure was built from (None if unrecorded)."""
+    path = Path(index_dir) / FINGERPRINTS_FILE
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f).get(name)
+
+
+def write_fingerprint(index_dir: PathLike, name: str, fingerprint: str):
+    """Record the fingerprint of the rows a derived structure was built from."""
+    path = Path(index_dir) / FINGERPRINTS_FILE
+    fingerprints = {}
+    if path.exists():
+        with open(path, 'r') as f:
+            fingerprints = json.load(f)
+    fingerprints[name] = fingerprint
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(fingerprints, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def remove_derived_files(index_dir: PathLike) -> List[str]:
+    """
+    Delete the codes and indexes built from the rows of an index directory.
+
+    Returns:
+        Names of the removed files
+    """
+    removed = []
+    for pattern in DERIVED_PATTERNS:
+        for path in Path(index_dir).glob(pattern):
+            path.unlink()
+            removed.append(path.name)
+    if removed:
+        logger.info(f"Removed derived files from {index_dir}: {', '.join(sorted(removed))}")
+    return removed
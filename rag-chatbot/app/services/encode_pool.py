@@ -0,0 +1,107 @@
+"""
+Encode Pool: Multi-process sentence-transformer encoding for bulk ingestion
+
+A single process encoding a large report leaves most CPU cores idle, and
+PyTorch's intra-op threading scales poorly past a few threads for small
+batches. The pool starts one worker process per slot, each with its own copy
+of the model and an even share of the cores; texts are split into chunks,
+distributed to the workers, and the results are reassembled in input order.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+import logging
+
+import numpy as np
+
+from app.services.length_batching import encode_bucketed, token_lengths
+
+logger = logging.getLogger(__name__)
+
+# Per-process model, set by _init_worker
+_worker: Dict = {}
+
+
+def _init_worker(model_name: str, num_threads: int):
+    """Executor initializer: load the model once per worker process."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(num_threads)
+    _worker['model'] = SentenceTransformer(model_name, device='cpu')
+
+
+def _encode_chunk(texts: List[str], batch_size: int, token_budget: int) -> np.ndarray:
+    model = _worker['model']
+    if token_budget <= 0:
+        return model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return encode_bucketed(
+        lambda batch: model.encode(batch, batch_size=len(batch), convert_to_numpy=True),
+        texts,
+        token_lengths(model, texts),
+        token_budget
+    )
+
+
+class EncodePool:
+    """Worker processes that each hold a copy of the embedding model."""
+
+    def __init__(self, model_name: str, num_workers: int = 0):
+        """
+        Start the worker processes.
+
+        Args:
+            model_name: Sentence transformer model name
+            num_workers: Worker processes (0 = one per 4 cores, at least 2)
+        """
+        cpus = os.cpu_count() or 1
+        self.num_workers = num_workers if num_workers > 0 else max(2, cpus // 4)
+        self.model_name = model_name
+
+        # spawn: forking a process that has already initialized torch threads is not safe
+        context = multiprocessing.get_context('spawn')
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model_name, max(1, cpus // self.num_workers))
+        )
+        logger.info(f"Started {self.num_workers} encode workers for {model_name}")
+
+    def encode(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        chunk_size: int = 256,
+        token_budget: int = 0
+    ) -> np.ndarray:
+        """
+        Encode texts across the workers.
+
+        Args:
+            texts: Texts to encode
+            batch_size: Texts per model.encode batch (without a token budget)
+            chunk_size: Maximum texts sent to a worker at a time (smaller inputs are
+                        split evenly so every worker gets a share)
+            token_budget: Padded tokens per length-sorted batch (0 = fixed batch_size)
+
+        Returns:
+            Embeddings in input order, shape (len(texts), dim)
+        """
+        chunk_size = max(1, min(chunk_size, math.ceil(len(texts) / self.num_workers)))
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+        # map() yields results in submission order, whichever worker finishes first
+        results = list(self.executor.map(
+            _encode_chunk,
+            chunks,
+            [batch_size] * len(chunks),
+            [token_budget] * len(chunks)
+        ))
+        return np.concatenate(results) if results else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        """Stop the worker processes."""
+        self.executor.shutdown(wait=True)
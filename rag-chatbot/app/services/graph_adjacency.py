@@ -0,0 +1,122 @@
+"""
+Graph Adjacency: Relationship indexes and neighborhood traversal shared by the graph services
+
+Relationships are indexed by node, direction and type, so looking up the
+relationships of a node costs O(degree) instead of a scan over the whole
+relationship list. get_neighborhoods() walks several seed entities in one
+breadth-first traversal over those indexes.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class AdjacencyMixin:
+    """
+    Adjacency indexes and BFS over self.relationships.
+
+    The host class provides self.relationships (graph.json relationship list)
+    and self.entities_by_id, and calls _build_adjacency() after loading them.
+    """
+
+    # Relationship type skipped by get_neighborhoods unless rel_types asks for it
+    neighborhood_excluded_type: Optional[str] = None
+
+    def _build_adjacency(self):
+        """Index relationships by node, direction and type."""
+        # Node ID -> relationship type -> positions in self.relationships
+        self.outgoing: Dict[str, Dict[str, List[int]]] = {}
+        self.incoming: Dict[str, Dict[str, List[int]]] = {}
+
+        for position, rel in enumerate(self.relationships):
+            rel_type = rel.get('type')
+            self.outgoing.setdefault(rel.get('from_'), {}).setdefault(rel_type, []).append(position)
+            self.incoming.setdefault(rel.get('to'), {}).setdefault(rel_type, []).append(position)
+
+    @staticmethod
+    def _positions(
+        index: Dict[str, Dict[str, List[int]]],
+        node_id: str,
+        rel_type: Optional[str] = None,
+        exclude_type: Optional[str] = None
+    ) -> List[int]:
+        """Relationship positions of one node in one adjacency index."""
+        by_type = index.get(node_id, {})
+        if rel_type:
+            return by_type.get(rel_type, [])
+        return [
+            position
+            for current_type, positions in by_type.items()
+            if current_type != exclude_type
+            for position in positions
+        ]
+
+    def _node_relationships(
+        self,
+        node_id: str,
+        rel_types: Optional[Iterable[str]] = None,
+        exclude_type: Optional[str] = None
+    ) -> List[Dict]:
+        """Relationships in either direction (of the given types), in graph.json order."""
+        positions = set()
+        for rel_type in (rel_types or [None]):
+            positions.update(self._positions(self.outgoing, node_id, rel_type, exclude_type))
+            positions.update(self._positions(self.incoming, node_id, rel_type, exclude_type))
+        return [self.relationships[position] for position in sorted(positions)]
+
+    def get_neighborhoods(
+        self,
+        seed_ids: List[str],
+        max_depth: int = 1,
+        rel_types: Optional[List[str]] = None,
+        limit_per_seed: Optional[int] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Breadth-first neighborhoods of several seed entities in one traversal.
+
+        Args:
+            seed_ids: Starting entity IDs
+            max_depth: How many hops to traverse (1 = direct neighbors only)
+            rel_types: Relationship types to follow (default: all but neighborhood_excluded_type)
+            limit_per_seed: Stop collecting a seed's neighbors after this many
+
+        Returns:
+            Seed ID -> [{'entity', 'distance', 'rel_type'}] in BFS order
+        """
+        neighborhoods = {seed_id: [] for seed_id in seed_ids}
+        if max_depth < 1:
+            return neighborhoods
+
+        visited = {seed_id: {seed_id} for seed_id in neighborhoods}
+        queue = deque((seed_id, seed_id, 0) for seed_id in neighborhoods)
+
+        while queue:
+            seed_id, current_id, depth = queue.popleft()
+            neighbors = neighborhoods[seed_id]
+
+            if depth >= max_depth or (limit_per_seed is not None and len(neighbors) >= limit_per_seed):
+                continue
+
+            for rel in self._node_relationships(current_id, rel_types, self.neighborhood_excluded_type):
+                related_id = None
+
+                if rel.get('from_') == current_id:
+                    related_id = rel.get('to')
+                elif rel.get('to') == current_id:
+                    related_id = rel.get('from_')
+
+                # Only entities are collected (chunks are not neighbors)
+                if related_id and related_id not in visited[seed_id]:
+                    entity = self.entities_by_id.get(related_id)
+                    if entity:
+                        visited[seed_id].add(related_id)
+                        neighbors.append({
+                            'entity': entity,
+                            'distance': depth + 1,
+                            'rel_type': rel.get('type')
+                        })
+                        queue.append((seed_id, related_id, depth + 1))
+
+                        if limit_per_seed is not None and len(neighbors) >= limit_per_seed:
+                            break
+
+        return neighborhoods
@@ -6,10 +6,12 @@ import hashlib
 from typing import Dict, List, Optional
 import logging
 
+from app.services.graph_adjacency import AdjacencyMixin
+
 logger = logging.getLogger(__name__)
 
 
-class GraphService:
+class GraphService(AdjacencyMixin):
     """Service for loading and querying the knowledge graph."""
 
     def __init__(self, graph_path: str, schema_path: str):
@@ -43,6 +45,7 @@ class GraphService:
 
         # Store relationships
         self.relationships = graph_data.get('relationships', [])
+        self._build_adjacency()
 
         # Load schema
         with open(self.schema_path, 'r') as f:
@@ -69,11 +72,7 @@ class GraphService:
 
     def get_relationships_for_entity(self, entity_id: str) -> List[Dict]:
         """Get all relationships involving an entity."""
-        related = []
-        for rel in self.relationships:
-            if rel.get('from_') == entity_id or rel.get('to') == entity_id:
-                related.append(rel)
-        return related
+        return self._node_relationships(entity_id)
 
     def get_related_entities(self, entity_id: str, max_depth: int = 1) -> List[Dict]:
         """
@@ -86,36 +85,8 @@ class GraphService:
         Returns:
             List of related entities
         """
-        if max_depth < 1:
-            return []
-
-        related_entities = []
-        visited = {entity_id}
-        queue = [(entity_id, 0)]
-
-        while queue:
-            current_id, depth = queue.pop(0)
-
-            if depth >= max_depth:
-                continue
-
-            # Get relationships
-            for rel in self.relationships:
-                related_id = None
-
-                if rel.get('from_') == current_id:
-                    related_id = rel.get('to')
-                elif rel.get('to') == current_id:
-                    related_id = rel.get('from_')
-
-                if related_id and related_id not in visited:
-                    visited.add(related_id)
-                    entity = self.get_entity_by_id(related_id)
-                    if entity:
-                        related_entities.append(entity)
-                        queue.append((related_id, depth + 1))
-
-        return related_entities
+        neighborhood = self.get_neighborhoods([entity_id], max_depth)[entity_id]
+        return [neighbor['entity'] for neighbor in neighborhood]
 
     def get_entities_by_type(self, entity_type: str) -> List[Dict]:
         """Get all entities of a specific type."""
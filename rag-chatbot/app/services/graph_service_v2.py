@@ -10,18 +10,27 @@ This version extends the original graph service to support:
 
 import json
 import hashlib
+from pathlib import Path
 from typing import Dict, List, Optional, Union
 import logging
 
+from app.services.chunk_dedup import load_chunk_groups
+from app.services.graph_adjacency import AdjacencyMixin
+
 logger = logging.getLogger(__name__)
 
 
-class GraphServiceV2:
+class GraphServiceV2(AdjacencyMixin):
     """Enhanced service for loading and querying the unified knowledge graph."""
 
-    def __init__(self, graph_path: str, schema_path: str = None):
+    # Chunk→entity MENTIONS links are not entity neighbors
+    neighborhood_excluded_type = 'MENTIONS'
+
+    def __init__(self, graph_path: str, schema_path: str = None, chunk_groups_path: str = None):
         self.graph_path = graph_path
         self.schema_path = schema_path
+        # Near-duplicate chunk groups written by build_vector_index.py --dedup-chunks
+        self.chunk_groups_path = chunk_groups_path
 
         # Separate indexes for entities and chunks
         self.entities_by_id = {}
@@ -35,6 +44,9 @@ class GraphServiceV2:
         self.relationships = []
         self.schema = {}
 
+        # Entity ID -> chunks listing it in 'mentions_entities'
+        self.chunks_mentioning: Dict[str, List[Dict]] = {}
+
         self._load_data()
 
     def _load_data(self):
@@ -80,8 +92,13 @@ class GraphServiceV2:
                     'node': chunk
                 }
 
+        # Collapse near-duplicate chunks onto their representative
+        if self.chunk_groups_path:
+            self._apply_chunk_groups(load_chunk_groups(self.chunk_groups_path))
+
         # Store relationships
         self.relationships = graph_data.get('relationships', [])
+        self._build_adjacency()
 
         # Load schema (optional)
         if self.schema_path:
@@ -94,6 +111,38 @@ class GraphServiceV2:
             f"{len(self.relationships)} relationships"
         )
 
+    def _build_adjacency(self):
+        """Index relationships by node, direction and type, and chunks by the entities they mention."""
+        super()._build_adjacency()
+
+        for chunk in self.chunks_by_id.values():
+            for entity_id in chunk.get('mentions_entities', []):
+                self.chunks_mentioning.setdefault(entity_id, []).append(chunk)
+
+    def _apply_chunk_groups(self, chunk_groups: Dict[str, List[Dict]]):
+        """
+        Keep only representative chunks in the hash indexes.
+
+        Member chunks stay reachable by ID; the representative lists every
+        member's source location under 'duplicates'.
+        """
+        collapsed = 0
+        for representative_hash, members in chunk_groups.items():
+            representative = self.chunks_by_hash.get(representative_hash)
+            if representative is None:
+                continue
+
+            representative['duplicates'] = [
+                m for m in members if m['embedding_hash'] != representative_hash
+            ]
+            for member in representative['duplicates']:
+                if self.chunks_by_hash.pop(member['embedding_hash'], None) is not None:
+                    self.nodes_by_hash.pop(member['embedding_hash'], None)
+                    collapsed += 1
+
+        if collapsed:
+            logger.info(f"Collapsed {collapsed} near-duplicate chunks into {len(chunk_groups)} groups")
+
     def _get_entity_text(self, entity: Dict) -> str:
         """Get the text representation used for embeddings."""
         return entity.get('label', '').strip()
@@ -159,15 +208,7 @@ class GraphServiceV2:
         Returns:
             List of relationships
         """
-        related = []
-        for rel in self.relationships:
-            if rel_type and rel.get('type') != rel_type:
-                continue
-
-            if rel.get('from_') == node_id or rel.get('to') == node_id:
-                related.append(rel)
-
-        return related
+        return self._node_relationships(node_id, [rel_type] if rel_type else None)
 
     def get_chunks_mentioning_entity(self, entity_id: str) -> List[Dict]:
         """
@@ -180,21 +221,20 @@ class GraphServiceV2:
             List of chunk dictionaries
         """
         chunks = []
+        seen = set()
 
         # Method 1: Via relationships (if MENTIONS relationships exist)
-        for rel in self.relationships:
-            if (rel.get('type') == 'MENTIONS' and
-                rel.get('to') == entity_id):
-                chunk_id = rel.get('from_')
-                chunk = self.chunks_by_id.get(chunk_id)
-                if chunk:
-                    chunks.append(chunk)
+        for position in self._positions(self.incoming, entity_id, 'MENTIONS'):
+            chunk = self.chunks_by_id.get(self.relationships[position].get('from_'))
+            if chunk and chunk['id'] not in seen:
+                seen.add(chunk['id'])
+                chunks.append(chunk)
 
         # Method 2: Via chunk properties (if mentions_entities exists)
-        for chunk in self.chunks_by_id.values():
-            if entity_id in chunk.get('mentions_entities', []):
-                if chunk not in chunks:  # Avoid duplicates
-                    chunks.append(chunk)
+        for chunk in self.chunks_mentioning.get(entity_id, []):
+            if chunk['id'] not in seen:  # Avoid duplicates
+                seen.add(chunk['id'])
+                chunks.append(chunk)
 
         return chunks
 
@@ -221,13 +261,10 @@ class GraphServiceV2:
 
         # Method 2: Via relationships (backup)
         if not entities:
-            for rel in self.relationships:
-                if (rel.get('type') == 'MENTIONS' and
-                    rel.get('from_') == chunk_id):
-                    entity_id = rel.get('to')
-                    entity = self.entities_by_id.get(entity_id)
-                    if entity:
-                        entities.append(entity)
+            for position in self._positions(self.outgoing, chunk_id, 'MENTIONS'):
+                entity = self.entities_by_id.get(self.relationships[position].get('to'))
+                if entity:
+                    entities.append(entity)
 
         return entities
 
@@ -246,41 +283,8 @@ class GraphServiceV2:
         Returns:
             List of related entities
         """
-        if max_depth < 1:
-            return []
-
-        related_entities = []
-        visited = {entity_id}
-        queue = [(entity_id, 0)]
-
-        while queue:
-            current_id, depth = queue.pop(0)
-
-            if depth >= max_depth:
-                continue
-
-            # Get relationships (exclude chunk relationships)
-            for rel in self.relationships:
-                # Skip chunk→entity relationships
-                if rel.get('type') == 'MENTIONS':
-                    continue
-
-                related_id = None
-
-                if rel.get('from_') == current_id:
-                    related_id = rel.get('to')
-                elif rel.get('to') == current_id:
-                    related_id = rel.get('from_')
-
-                # Check if related_id is an entity (not a chunk)
-                if related_id and related_id not in visited:
-                    entity = self.entities_by_id.get(related_id)
-                    if entity:
-                        visited.add(related_id)
-                        related_entities.append(entity)
-                        queue.append((related_id, depth + 1))
-
-        return related_entities
+        neighborhood = self.get_neighborhoods([entity_id], max_depth)[entity_id]
+        return [neighbor['entity'] for neighbor in neighborhood]
 
     # ==================== Type-based Queries ====================
 
@@ -298,6 +302,49 @@ class GraphServiceV2:
             if chunk.get('source_file') == source_file
         ]
 
+    def get_search_metadata(self) -> Dict[str, Dict[str, Union[str, List[str], None]]]:
+        """
+        Per-embedding metadata used to pre-filter vector search.
+
+        Returns:
+            Embedding hash -> {'node_type', 'entity_type', 'source_file', 'country'}
+            (country is a list for chunks that mention several locations)
+        """
+        metadata = {}
+
+        for hash_id, node_info in self.nodes_by_hash.items():
+            node = node_info['node']
+            properties = node.get('properties', {})
+
+            if node_info['type'] == 'entity':
+                entity_type = node.get('type')
+                source_file = properties.get('source_urls')
+            else:
+                entity_type = None
+                source_file = node.get('source_file')
+
+            # Explicit country field, the label of a location entity, or the
+            # locations a chunk mentions
+            country = node.get('country') or properties.get('country')
+            if not country and entity_type == 'location':
+                country = node.get('label')
+            if not country and node_info['type'] == 'chunk':
+                country = sorted({
+                    entity['label']
+                    for entity in (self.entities_by_id.get(e) for e in node.get('mentions_entities', []))
+                    if entity and entity.get('type') == 'location' and entity.get('label')
+                }) or None
+
+            metadata[hash_id] = {
+                'node_type': node_info['type'],
+                'entity_type': entity_type,
+                # Entities cite 'Report.txt', chunks use the bare stem
+                'source_file': Path(source_file).stem if source_file else None,
+                'country': country
+            }
+
+        return metadata
+
     # ==================== Search ====================
 
     def search_entities(self, query: str, limit: int = 10) -> List[Dict]:
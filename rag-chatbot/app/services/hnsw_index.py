@@ -0,0 +1,394 @@
+"""
+HNSW Index: Hierarchical navigable small-world graph for approximate search
+
+Uses hnswlib when it is installed and falls back to a pure-NumPy
+implementation otherwise. Both backends:
+- take M and ef_construction at build time and ef_search per query
+- persist into the binary index directory
+- support incremental inserts of rows appended to the embedding matrix
+
+Rows are identified by their position in the embedding store, so inserting
+new rows only requires the rows after the last indexed one.
+"""
+import heapq
+import json
+import threading
+from pathlib import Path
+from typing import List, Tuple, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    hnswlib = None
+    HNSWLIB_AVAILABLE = False
+
+HNSW_META_FILE = "hnsw.json"
+HNSW_NUMPY_FILE = "hnsw.npz"
+HNSW_LIB_FILE = "hnsw.bin"
+
+
+class NumpyHNSW:
+    """Pure-NumPy HNSW graph over an external (N, D) matrix of unit vectors."""
+
+    def __init__(self, M: int = 16, ef_construction: int = 200, seed: int = 0):
+        """
+        Initialize empty graph.
+
+        Args:
+            M: Neighbours per node on upper levels (2 * M on level 0)
+            ef_construction: Candidate list size while inserting
+            seed: Random seed for level assignment
+        """
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.level_mult = 1.0 / np.log(max(M, 2))
+        self.rng = np.random.default_rng(seed)
+
+        self.count = 0
+        self.levels = np.zeros(0, dtype=np.int8)
+        # Level 0 is dense (fixed width, -1 padded); upper levels are sparse
+        self.neighbors0 = np.full((0, self.M0), -1, dtype=np.int32)
+        self.upper: List[dict] = []
+        self.entry_point = -1
+        self.max_level = -1
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ==================== Graph Access ====================
+
+    def _neighbors(self, level: int, node: int) -> List[int]:
+        if level == 0:
+            row = self.neighbors0[node]
+            return row[row >= 0].tolist()
+        return self.upper[level - 1].get(node, [])
+
+    def _set_neighbors(self, level: int, node: int, neighbors: List[int]):
+        if level == 0:
+            self.neighbors0[node] = -1
+            self.neighbors0[node, :len(neighbors)] = neighbors
+        else:
+            self.upper[level - 1][node] = list(neighbors)
+
+    def _reserve(self, capacity: int):
+        """Grow the dense level-0 arrays to hold at least `capacity` nodes."""
+        if capacity <= len(self.levels):
+            return
+        capacity = max(capacity, 2 * len(self.levels))
+
+        levels = np.zeros(capacity, dtype=np.int8)
+        levels[:self.count] = self.levels[:self.count]
+        neighbors0 = np.full((capacity, self.M0), -1, dtype=np.int32)
+        neighbors0[:self.count] = self.neighbors0[:self.count]
+
+        self.levels, self.neighbors0 = levels, neighbors0
+
+    # ==================== Search ====================
+
+    def _search_layer(
+        self,
+        vectors: np.ndarray,
+        query: np.ndarray,
+        entry_points: List[int],
+        ef: int,
+        level: int
+    ) -> List[Tuple[float, int]]:
+        """Best-first search on one level; returns (similarity, node) sorted descending."""
+        visited = set(entry_points)
+        entry_sims = np.asarray(vectors[entry_points]) @ query
+
+        candidates = [(-float(sim), node) for sim, node in zip(entry_sims, entry_points)]
+        heapq.heapify(candidates)
+        results = [(float(sim), node) for sim, node in zip(entry_sims, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+
+            new_nodes = [n for n in self._neighbors(level, node) if n not in visited]
+            if not new_nodes:
+                continue
+            visited.update(new_nodes)
+
+            # Score all unvisited neighbours with one matrix-vector product
+            sims = np.asarray(vectors[new_nodes]) @ query
+            for sim, neighbor in zip(sims.tolist(), new_nodes):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbor))
+                    heapq.heappush(results, (sim, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _descend(self, vectors: np.ndarray, query: np.ndarray, target_level: int) -> List[int]:
+        """Greedy search from the entry point down to target_level + 1."""
+        entry = [self.entry_point]
+        for level in range(self.max_level, target_level, -1):
+            entry = [self._search_layer(vectors, query, entry, 1, level)[0][1]]
+        return entry
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int, ef: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k search.
+
+        Args:
+            vectors: Matrix the graph was built on
+            query: Unit-normalized query, shape (D,)
+            k: Number of results
+            ef: Candidate list size on level 0 (>= k)
+
+        Returns:
+            (row_indices, similarities) arrays, sorted by similarity (descending)
+        """
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        entry = self._descend(vectors, query, 0)
+        results = self._search_layer(vectors, query, entry, max(ef, k), 0)[:k]
+
+        rows = np.array([node for _, node in results], dtype=np.int64)
+        sims = np.array([sim for sim, _ in results], dtype=np.float32)
+        return rows, sims
+
+    # ==================== Insert ====================
+
+    def _link(self, vectors: np.ndarray, level: int, node: int, new_neighbor: int):
+        """Add a back-link, keeping only the closest neighbours when over capacity."""
+        max_neighbors = self.M0 if level == 0 else self.M
+        neighbors = self._neighbors(level, node) + [new_neighbor]
+
+        if len(neighbors) > max_neighbors:
+            sims = np.asarray(vectors[neighbors]) @ np.asarray(vectors[node])
+            keep = np.argsort(-sims)[:max_neighbors]
+            neighbors = [neighbors[i] for i in keep]
+
+        self._set_neighbors(level, node, neighbors)
+
+    def _insert(self, vectors: np.ndarray, node: int):
+        query = np.asarray(vectors[node], dtype=np.float32)
+        level = int(-np.log(1.0 - self.rng.random()) * self.level_mult)
+        self.levels[node] = level
+        while len(self.upper) < level:
+            self.upper.append({})
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry = self._descend(vectors, query, level)
+        for current in range(min(level, self.max_level), -1, -1):
+            candidates = self._search_layer(vectors, query, entry, self.ef_construction, current)
+            selected = [n for _, n in candidates[:self.M]]
+
+            self._set_neighbors(current, node, selected)
+            for neighbor in selected:
+                self._link(vectors, current, neighbor, node)
+
+            entry = [n for _, n in candidates]
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def add_items(self, vectors: np.ndarray):
+        """Insert every row of `vectors` past the last indexed row."""
+        self._reserve(len(vectors))
+        for node in range(self.count, len(vectors)):
+            self._insert(vectors, node)
+            self.count = node + 1
+
+    # ==================== Persistence ====================
+
+    def save(self, path: Path):
+        arrays = {
+            'levels': self.levels[:self.count],
+            'neighbors0': self.neighbors0[:self.count],
+            'header': np.array([self.M, self.ef_construction, self.entry_point, self.max_level], dtype=np.int64)
+        }
+        # Upper levels as CSR: nodes, offsets into a flat neighbour array
+        for level, graph in enumerate(self.upper, start=1):
+            nodes = np.array(sorted(graph), dtype=np.int64)
+            lengths = [len(graph[n]) for n in nodes]
+            arrays[f'upper{level}_nodes'] = nodes
+            arrays[f'upper{level}_offsets'] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            arrays[f'upper{level}_flat'] = np.array(
+                [n for node in nodes for n in graph[node]], dtype=np.int64
+            )
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> 'NumpyHNSW':
+        data = np.load(path)
+        M, ef_construction, entry_point, max_level = data['header'].tolist()
+
+        graph = cls(M=M, ef_construction=ef_construction)
+        graph.levels = data['levels']
+        graph.neighbors0 = data['neighbors0']
+        graph.count = len(graph.levels)
+        graph.entry_point, graph.max_level = entry_point, max_level
+
+        for level in range(1, max(max_level, 0) + 1):
+            nodes = data[f'upper{level}_nodes']
+            offsets = data[f'upper{level}_offsets']
+            flat = data[f'upper{level}_flat']
+            graph.upper.append({
+                int(node): flat[offsets[i]:offsets[i + 1]].tolist()
+                for i, node in enumerate(nodes)
+            })
+
+        return graph
+
+
+class HNSWIndex:
+    """HNSW backend selector: hnswlib when available, NumPy otherwise."""
+
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 200, backend: str = 'auto'):
+        """
+        Initialize empty index.
+
+        Args:
+            dim: Embedding dimension
+            M: Graph degree
+            ef_construction: Candidate list size while inserting
+            backend: 'hnswlib', 'numpy' or 'auto'
+        """
+        if backend == 'auto':
+            backend = 'hnswlib' if HNSWLIB_AVAILABLE else 'numpy'
+        if backend == 'hnswlib' and not HNSWLIB_AVAILABLE:
+            raise ImportError("hnswlib is not installed (pip install hnswlib) - use backend='numpy'")
+
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.backend = backend
+
+        # hnswlib keeps ef as index state, so set_ef + query must not interleave
+        self._lock = threading.Lock()
+
+        if backend == 'hnswlib':
+            self.graph = hnswlib.Index(space='ip', dim=dim)
+            self.graph.init_index(max_elements=1, ef_construction=ef_construction, M=M)
+        else:
+            self.graph = NumpyHNSW(M=M, ef_construction=ef_construction)
+
+    def __len__(self) -> int:
+        if self.backend == 'hnswlib':
+            return self.graph.get_current_count()
+        return len(self.graph)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, M: int = 16, ef_construction: int = 200, backend: str = 'auto') -> 'HNSWIndex':
+        """Build an index over all rows of vectors."""
+        index = cls(vectors.shape[1], M=M, ef_construction=ef_construction, backend=backend)
+        logger.info(f"Building HNSW index ({index.backend}, M={M}, ef_construction={ef_construction}) on {len(vectors)} vectors")
+        index.add_items(vectors)
+        return index
+
+    def add_items(self, vectors: np.ndarray):
+        """Insert the rows of `vectors` that are not indexed yet (row id = position)."""
+        start = len(self)
+        if start >= len(vectors):
+            return
+
+        if self.backend == 'hnswlib':
+            self.graph.resize_index(len(vectors))
+            self.graph.add_items(
+                np.asarray(vectors[start:], dtype=np.float32),
+                np.arange(start, len(vectors))
+            )
+        else:
+            self.graph.add_items(vectors)
+
+        logger.info(f"HNSW index now holds {len(self)} vectors ({len(vectors) - start} inserted)")
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query_normalized: np.ndarray,
+        k: int,
+        ef_search: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k search.
+
+        Args:
+            vectors: Matrix the index was built on (used by the NumPy backend)
+            query_normalized: Unit-normalized query, shape (D,)
+            k: Number of results
+            ef_search: Candidate list size (recall/latency trade-off)
+
+        Returns:
+            (row_indices, similarities) arrays, sorted by similarity (descending)
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.backend == 'hnswlib':
+            with self._lock:
+                self.graph.set_ef(max(ef_search, k))
+                labels, distances = self.graph.knn_query(query_normalized, k=k)
+            # Inner-product space reports distance = 1 - dot
+            return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+        return self.graph.search(vectors, query_normalized, k, ef_search)
+
+    # ==================== Persistence ====================
+
+    def save(self, index_dir: Union[str, Path]):
+        """Write the index into an index directory."""
+        index_dir = Path(index_dir)
+        if self.backend == 'hnswlib':
+            self.graph.save_index(str(index_dir / HNSW_LIB_FILE))
+        else:
+            self.graph.save(index_dir / HNSW_NUMPY_FILE)
+
+        with open(index_dir / HNSW_META_FILE, 'w') as f:
+            json.dump({
+                'backend': self.backend,
+                'dim': self.dim,
+                'M': self.M,
+                'ef_construction': self.ef_construction,
+                'count': len(self)
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, index_dir: Union[str, Path]):
+        """Load the index from an index directory (None if it was never built)."""
+        index_dir = Path(index_dir)
+        meta_path = index_dir / HNSW_META_FILE
+        if not meta_path.exists():
+            return None
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+
+        if meta['backend'] == 'hnswlib' and not HNSWLIB_AVAILABLE:
+            logger.warning("HNSW index was built with hnswlib, which is not installed")
+            return None
+
+        index = cls.__new__(cls)
+        index.dim = meta['dim']
+        index.M = meta['M']
+        index.ef_construction = meta['ef_construction']
+        index.backend = meta['backend']
+        index._lock = threading.Lock()
+
+        if index.backend == 'hnswlib':
+            index.graph = hnswlib.Index(space='ip', dim=index.dim)
+            index.graph.load_index(str(index_dir / HNSW_LIB_FILE), max_elements=meta['count'])
+        else:
+            index.graph = NumpyHNSW.load(index_dir / HNSW_NUMPY_FILE)
+
+        return index
@@ -0,0 +1,112 @@
+"""
+Index Reloader: Swap in new graph / vector index generations without a restart
+
+A new GraphServiceV2 and vector index generation are built in the background
+while the current ones keep serving. The swap only replaces references, so
+requests that are already running finish against the generation they started
+with, and the embedding model stays loaded.
+"""
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+from app.services.graph_service_v2 import GraphServiceV2
+
+logger = logging.getLogger(__name__)
+
+
+class IndexReloader:
+    """Rebuilds the graph and vector index when graph.json changes."""
+
+    def __init__(self, rag_service, graph_path: str, schema_path: str = None, chunk_groups_path: str = None):
+        """
+        Initialize reloader.
+
+        Args:
+            rag_service: RAGServiceV2 whose graph / vector index are swapped
+            graph_path: Path to graph.json
+            schema_path: Path to the ontology schema (optional)
+            chunk_groups_path: Index directory or chunk_groups.json (optional)
+        """
+        self.rag_service = rag_service
+        self.graph_path = Path(graph_path)
+        self.schema_path = schema_path
+        self.chunk_groups_path = chunk_groups_path
+
+        self.generation = 0
+        self._graph_mtime = self.graph_path.stat().st_mtime
+
+        # One reload at a time (watcher thread and /admin/reload)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reload(self) -> Dict:
+        """
+        Load a new generation and swap it in.
+
+        If loading fails the current generation keeps serving.
+
+        Returns:
+            Statistics of the new generation
+        """
+        with self._lock:
+            start = time.time()
+            graph_mtime = self.graph_path.stat().st_mtime
+
+            graph = GraphServiceV2(str(self.graph_path), self.schema_path, self.chunk_groups_path)
+            self.rag_service.swap_graph(graph)
+
+            self._graph_mtime = graph_mtime
+            self.generation += 1
+
+            stats = {
+                'generation': self.generation,
+                'entities': len(graph.entities_by_id),
+                'chunks': len(graph.chunks_by_id),
+                'embeddings': len(self.rag_service.vector_search),
+                'seconds': round(time.time() - start, 2)
+            }
+
+        logger.info(f"Swapped in index generation {stats['generation']} in {stats['seconds']}s")
+        return stats
+
+    def reload_if_changed(self) -> Optional[Dict]:
+        """Reload when graph.json was modified since the last load."""
+        if self.graph_path.stat().st_mtime == self._graph_mtime:
+            return None
+        logger.info(f"{self.graph_path} changed; loading a new generation")
+        return self.reload()
+
+    def start(self, interval: float = 30.0):
+        """
+        Watch graph.json in a background thread.
+
+        Args:
+            interval: Seconds between checks
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    # A half-written graph.json is retried on the next check
+                    logger.error(f"Index reload failed: {e}", exc_info=True)
+
+        self._thread = threading.Thread(target=run, name="index-reloader", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.graph_path} every {interval}s")
+
+    def stop(self):
+        """Stop the watcher thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._stop.clear()
@@ -0,0 +1,524 @@
+"""
+Index Segment: One immutable block of embedding rows and its search structures
+
+VectorSearchService searches a base segment (optionally quantized and/or
+covered by an IVF / HNSW index) plus small append segments that are scanned
+exactly. Rows are never modified in place; deletes only set a tombstone bit.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore, read_fingerprint, write_fingerprint
+from app.services.quantization import ScalarQuantizer, build_quantized_codes
+from app.services.product_quantization import PQ_MODE, ProductQuantizer, build_pq_codes
+from app.services.matryoshka import PrefixQuantizer, build_prefix_codes, parse_prefix_mode
+from app.services.ivf_index import IVFIndex
+from app.services.hnsw_index import HNSWIndex
+from app.services.sharded_search import ShardPool
+from app.services.topk import top_k_rows, top_k_rows_batch
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+
+# Allowed-row sets up to this size are scored exactly instead of searched
+EXACT_SUBSET_ROWS = 4096
+
+Filters = Dict[str, Union[str, List[str]]]
+
+
+class IndexSegment:
+    """Embedding rows with tombstones, metadata columns and optional ANN structures."""
+
+    def __init__(self, store: EmbeddingStore, name: str = 'base', metadata: Optional[Dict[str, Dict]] = None):
+        """
+        Initialize segment.
+
+        Args:
+            store: Embedding rows of the segment
+            name: Segment name (for logging)
+            metadata: Hash -> metadata columns shipped with the segment
+        """
+        self.store = store
+        self.name = name
+        self.metadata = metadata or {}
+
+        # Tombstone bitmap
+        self.deleted = np.zeros(len(store), dtype=bool)
+        self.num_deleted = 0
+
+        # Named row subsets and categorical metadata columns
+        self.partition_rows: Dict[str, np.ndarray] = {}
+        self.metadata_codes: Dict[str, np.ndarray] = {}
+        # Further values of multi-valued columns: column -> (rows, codes)
+        self.metadata_extra: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+        # Optional quantized copy used for the coarse scan
+        self.quantizer = None
+        self.codes = None
+        self.rescore_factor = 4
+
+        # Optional approximate index used to generate candidate rows
+        self.ivf_index = None
+        self.nprobe = 8
+        self.hnsw_index = None
+        self.ef_search = 64
+
+        # Optional worker processes that scan row shards in parallel
+        self.shard_pool = None
+
+        self._fingerprint = None
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self.store.hashes
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self.store.vectors
+
+    def fingerprint(self) -> str:
+        """Content fingerprint of the segment rows (computed once)."""
+        if self._fingerprint is None:
+            self._fingerprint = self.store.fingerprint()
+        return self._fingerprint
+
+    # ==================== Search Structures ====================
+
+    def configure(
+        self,
+        quantization: Optional[str] = None,
+        rescore_factor: int = 4,
+        index_type: str = 'flat',
+        nprobe: int = 8,
+        ef_search: int = 64,
+        shards: int = 0
+    ):
+        """Load (or build) the quantized codes and approximate index for this segment."""
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+
+        self.rescore_factor = rescore_factor
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+        if quantization:
+            self._load_quantized(quantization)
+        if index_type == 'ivf':
+            self._load_ivf()
+        elif index_type == 'hnsw':
+            self._load_hnsw()
+
+        if shards > 1:
+            if self.is_flat:
+                self.shard_pool = ShardPool(self.vectors, shards, self.store.index_dir)
+            else:
+                logger.warning("Sharded search only applies to exact flat scans; ignoring shards")
+
+    def close(self):
+        """Release worker processes held by the segment."""
+        if self.shard_pool is not None:
+            self.shard_pool.close()
+            self.shard_pool = None
+
+    def _persist(self, what: str, save, name: str):
+        """Save a structure built in memory next to the vectors, with the fingerprint of the rows."""
+        if self.store.index_dir is None:
+            return
+        try:
+            save(self.store.index_dir)
+            write_fingerprint(self.store.index_dir, name, self.fingerprint())
+            logger.info(f"Saved {what} to {self.store.index_dir}")
+        except OSError as e:
+            logger.warning(f"Could not save {what} to {self.store.index_dir}: {e}")
+
+    def _load_quantized(self, mode: str):
+        """Load quantized codes from the binary index, or build them."""
+        prefix_dim = parse_prefix_mode(mode)
+        if mode == PQ_MODE:
+            quantizer_cls = ProductQuantizer
+        elif prefix_dim is not None:
+            quantizer_cls = PrefixQuantizer
+        else:
+            quantizer_cls = ScalarQuantizer
+        if self.store.index_dir is not None:
+            self.quantizer, self.codes = quantizer_cls.load(self.store.index_dir, mode)
+
+        if self.codes is not None and read_fingerprint(self.store.index_dir, mode) != self.fingerprint():
+            logger.warning(f"Prebuilt {mode} codes were built from other vectors than segment {self.name}")
+            self.quantizer, self.codes = None, None
+
+        if self.quantizer is None:
+            if mode == PQ_MODE:
+                logger.warning(
+                    f"No PQ codebooks found for segment {self.name}; training. "
+                    f"Run scripts/train_pq_codebooks.py to train them offline."
+                )
+                self.quantizer, self.codes = build_pq_codes(self.vectors)
+            elif prefix_dim is not None:
+                logger.warning(f"No prebuilt {mode} prefix codes found for segment {self.name}; truncating")
+                self.quantizer, self.codes = build_prefix_codes(self.vectors, prefix_dim)
+            else:
+                logger.warning(f"No prebuilt {mode} codes found for segment {self.name}; quantizing")
+                self.quantizer, self.codes = build_quantized_codes(self.vectors, mode)
+            self._persist(f"{mode} codes", lambda d: self.quantizer.save(d, self.codes), mode)
+
+        logger.info(f"Quantized search enabled ({mode}, rescore factor {self.rescore_factor})")
+
+    def _load_ivf(self):
+        """Load the IVF index from the binary index, or train it."""
+        if self.store.index_dir is not None:
+            self.ivf_index = IVFIndex.load(self.store.index_dir)
+
+        if self.ivf_index is not None and read_fingerprint(self.store.index_dir, 'ivf') != self.fingerprint():
+            logger.warning(f"Prebuilt IVF index was built from other vectors than segment {self.name}")
+            self.ivf_index = None
+
+        if self.ivf_index is None:
+            logger.warning(f"No prebuilt IVF index found for segment {self.name}; training")
+            self.ivf_index = IVFIndex.build(self.vectors)
+            self._persist("IVF index", self.ivf_index.save, 'ivf')
+
+        logger.info(f"IVF search enabled ({self.ivf_index.nlist} lists, nprobe {self.nprobe})")
+
+    def _load_hnsw(self):
+        """Load the HNSW index from the binary index, or build it."""
+        if self.store.index_dir is not None:
+            self.hnsw_index = HNSWIndex.load(self.store.index_dir)
+
+        # The graph can only be extended if the rows it already holds are unchanged
+        if self.hnsw_index is not None and (
+            len(self.hnsw_index) > len(self.store)
+            or read_fingerprint(self.store.index_dir, 'hnsw') != self.store.fingerprint(len(self.hnsw_index))
+        ):
+            logger.warning(f"Prebuilt HNSW index was built from other vectors than segment {self.name}")
+            self.hnsw_index = None
+
+        if self.hnsw_index is None:
+            logger.warning(f"No prebuilt HNSW index found for segment {self.name}; building")
+            self.hnsw_index = HNSWIndex.build(self.vectors)
+            self._persist("HNSW index", self.hnsw_index.save, 'hnsw')
+        elif len(self.hnsw_index) < len(self.store):
+            # Rows appended since the last build are inserted incrementally
+            self.hnsw_index.add_items(self.vectors)
+            self._persist("HNSW index", self.hnsw_index.save, 'hnsw')
+
+        logger.info(f"HNSW search enabled ({self.hnsw_index.backend}, ef_search {self.ef_search})")
+
+    @property
+    def is_flat(self) -> bool:
+        """True when every query is an exact scan over full-precision vectors."""
+        return self.quantizer is None and self.ivf_index is None and self.hnsw_index is None
+
+    # ==================== Tombstones, Partitions, Metadata ====================
+
+    def delete_hashes(self, hashes: List[str]) -> int:
+        """Set tombstones for the given hashes; returns the number of newly deleted rows."""
+        if not len(hashes):
+            return 0
+        rows = self.store.rows_for_hashes(hashes)
+        rows = rows[rows >= 0]
+        rows = rows[~self.deleted[rows]]
+
+        self.deleted[rows] = True
+        self.num_deleted += len(rows)
+        if self.shard_pool is not None and len(rows):
+            self.shard_pool.delete_rows(rows)
+        return len(rows)
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self.deleted)
+
+    def set_partitions(self, partition_hashes: Dict[str, List[str]]):
+        """Resolve partition hashes (plus shipped node_type metadata) to row arrays."""
+        partition_rows = {}
+        for name, hashes in partition_hashes.items():
+            member_hashes = list(hashes) + [
+                h for h, values in self.metadata.items() if values.get('node_type') == name
+            ]
+            rows = self.store.rows_for_hashes(member_hashes)
+            partition_rows[name] = np.unique(rows[rows >= 0])
+        self.partition_rows = partition_rows
+
+        if self.shard_pool is not None:
+            self.shard_pool.set_groups(self.partition_rows)
+
+    def set_metadata(self, metadata: Dict[str, Dict[str, Optional[str]]], vocab: Dict[str, Dict[str, int]]):
+        """
+        Build int32 code columns (-1 = missing) from shipped and external metadata.
+
+        A list value gives the row several values; the first goes into the
+        column, the rest into metadata_extra.
+
+        Args:
+            metadata: Hash -> metadata columns (overrides the segment's own metadata)
+            vocab: Shared column -> value -> code mapping, extended in place
+        """
+        codes: Dict[str, np.ndarray] = {}
+        extra: Dict[str, Dict[int, List[int]]] = {}
+
+        for source in (self.metadata, metadata):
+            if not source:
+                continue
+            hashes = list(source.keys())
+            rows = self.store.rows_for_hashes(hashes)
+
+            for row, text_hash in zip(rows, hashes):
+                if row < 0:
+                    continue
+                for name, value in source[text_hash].items():
+                    column = codes.get(name)
+                    if column is None:
+                        column = codes[name] = np.full(len(self.store), -1, dtype=np.int32)
+                    values = value if isinstance(value, list) else [value]
+                    values = [v for v in values if v is not None]
+                    column_vocab = vocab.setdefault(name, {})
+                    value_codes = [column_vocab.setdefault(str(v).lower(), len(column_vocab)) for v in values]
+
+                    column[row] = value_codes[0] if value_codes else -1
+                    extra.setdefault(name, {})[row] = value_codes[1:]
+
+        self.metadata_codes = codes
+        self.metadata_extra = {}
+        for name, row_codes in extra.items():
+            pairs = [(row, code) for row, row_values in row_codes.items() for code in row_values]
+            if pairs:
+                rows, values = zip(*pairs)
+                self.metadata_extra[name] = (np.array(rows, dtype=np.int64), np.array(values, dtype=np.int32))
+
+    def filter_rows(self, filters: Optional[Filters], vocab: Dict[str, Dict[str, int]]) -> Optional[np.ndarray]:
+        """
+        Rows matching all filters (a list of values matches any of them).
+
+        Returns:
+            Sorted row ids, or None when there are no filters
+        """
+        if not filters:
+            return None
+
+        mask = np.ones(len(self.store), dtype=bool)
+        for name, wanted in filters.items():
+            column = self.metadata_codes.get(name)
+            if column is None:
+                return np.empty(0, dtype=np.int64)
+
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            column_vocab = vocab.get(name, {})
+            wanted_codes = [column_vocab[str(v).lower()] for v in wanted if str(v).lower() in column_vocab]
+
+            matches = np.isin(column, wanted_codes)
+            if name in self.metadata_extra:
+                extra_rows, extra_codes = self.metadata_extra[name]
+                matches[extra_rows[np.isin(extra_codes, wanted_codes)]] = True
+            mask &= matches
+
+        return np.flatnonzero(mask)
+
+    # ==================== Search ====================
+
+    def search(
+        self,
+        query_normalized: np.ndarray,
+        top_k: int,
+        min_similarity: float,
+        ef_search: Optional[int] = None,
+        allowed_rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k live rows for a unit query, optionally restricted to sorted allowed_rows.
+
+        Returns:
+            (row_indices, similarities) arrays, sorted by similarity (descending)
+        """
+        if self.shard_pool is not None and (allowed_rows is None or len(allowed_rows) > EXACT_SUBSET_ROWS):
+            # Shards apply their own tombstones
+            return self.shard_pool.search(
+                query_normalized[None], top_k, min_similarity, allowed_rows=allowed_rows
+            )[0][None]
+
+        if self.num_deleted:
+            allowed_rows = self.live_rows() if allowed_rows is None else allowed_rows[~self.deleted[allowed_rows]]
+
+        # Small allowed sets are cheapest to score exactly
+        if allowed_rows is not None and len(allowed_rows) <= EXACT_SUBSET_ROWS:
+            return self._rescore(allowed_rows, query_normalized, top_k, min_similarity)
+
+        if self.hnsw_index is not None:
+            return self._search_hnsw(query_normalized, top_k, min_similarity, ef_search, allowed_rows)
+
+        # Candidate rows (None = every row)
+        candidates = allowed_rows
+        if self.ivf_index is not None:
+            candidates = self.ivf_index.probe(query_normalized, self.nprobe)
+            if allowed_rows is not None:
+                candidates = np.intersect1d(candidates, allowed_rows, assume_unique=True)
+
+        scores = self.scan(query_normalized, candidates)
+
+        if self.quantizer is not None:
+            # Coarse scores from quantized codes, then exact rescoring of candidates
+            picked, _ = top_k_rows(scores, top_k * self.rescore_factor)
+            if candidates is not None:
+                picked = candidates[picked]
+            return self._rescore(picked, query_normalized, top_k, min_similarity)
+
+        rows, scores = top_k_rows(scores, top_k, min_similarity)
+        if candidates is not None:
+            rows = candidates[rows]
+        return rows, scores
+
+    def scan(self, query_normalized: np.ndarray, candidates: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Score candidate rows (every row if None) with the quantized codes or full vectors.
+
+        Returns:
+            Scores aligned with candidates
+        """
+        matrix = self.codes if self.quantizer is not None else self.vectors
+
+        # Gather small candidate sets; index into a full scan for large ones
+        if candidates is not None and len(candidates) * 4 < len(matrix):
+            matrix = np.asarray(matrix[candidates])
+            candidates = None
+
+        if self.quantizer is not None:
+            scores = self.quantizer.score(matrix, query_normalized)
+        else:
+            scores = matrix @ query_normalized
+
+        return scores if candidates is None else scores[candidates]
+
+    def _rescore(
+        self,
+        candidates: np.ndarray,
+        query_normalized: np.ndarray,
+        top_k: int,
+        min_similarity: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score candidate rows at full precision and keep the top-k."""
+        # Sorted row order keeps reads from the memory-mapped matrix sequential
+        candidates = np.sort(candidates)
+        exact_scores = np.asarray(self.vectors[candidates]) @ query_normalized
+
+        rows, scores = top_k_rows(exact_scores, top_k, min_similarity)
+        return candidates[rows], scores
+
+    def _search_hnsw(
+        self,
+        query_normalized: np.ndarray,
+        top_k: int,
+        min_similarity: float,
+        ef_search: Optional[int],
+        allowed_rows: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Graph search; restricted searches over-fetch until enough allowed rows are found."""
+        fetch = top_k
+        if allowed_rows is not None:
+            fetch = top_k * max(1, len(self.store) // max(len(allowed_rows), 1))
+
+        while True:
+            # Graph search returns exact similarities for the rows it visits
+            graph_rows, graph_scores = self.hnsw_index.search(
+                self.vectors,
+                query_normalized,
+                fetch,
+                max(ef_search or self.ef_search, fetch)
+            )
+            if allowed_rows is None:
+                break
+
+            keep = np.isin(graph_rows, allowed_rows, assume_unique=True)
+            if keep.sum() >= top_k or fetch >= len(self.store):
+                graph_rows, graph_scores = graph_rows[keep], graph_scores[keep]
+                break
+            fetch *= 2
+
+        rows, scores = top_k_rows(graph_scores, top_k, min_similarity)
+        return graph_rows[rows], scores
+
+    def search_partitions(
+        self,
+        query_normalized: np.ndarray,
+        top_k: int,
+        min_similarity: float,
+        ef_search: Optional[int] = None,
+        filter_rows: Optional[np.ndarray] = None
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Independent top-k for every partition of this segment."""
+        if self.shard_pool is not None:
+            # One scatter: every shard scores its rows once and selects per partition
+            return self.shard_pool.search(
+                query_normalized[None],
+                top_k,
+                min_similarity,
+                groups=list(self.partition_rows),
+                allowed_rows=filter_rows
+            )[0]
+
+        # Exact flat search: score every row once and select per partition
+        shared_scores = self.scan(query_normalized, None) if self.is_flat else None
+
+        results = {}
+        for name, partition_rows in self.partition_rows.items():
+            if filter_rows is not None:
+                partition_rows = np.intersect1d(partition_rows, filter_rows, assume_unique=True)
+
+            if shared_scores is not None:
+                if self.num_deleted:
+                    partition_rows = partition_rows[~self.deleted[partition_rows]]
+                rows, scores = top_k_rows(shared_scores[partition_rows], top_k, min_similarity)
+                results[name] = (partition_rows[rows], scores)
+            else:
+                results[name] = self.search(
+                    query_normalized, top_k, min_similarity, ef_search, partition_rows
+                )
+
+        return results
+
+    def search_batch(
+        self,
+        query_block: np.ndarray,
+        top_k: int,
+        min_similarity: float,
+        ef_search: Optional[int] = None,
+        allowed_rows: Optional[np.ndarray] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Per-query top-k for a block of unit queries, shape (Q, D), optionally restricted to allowed_rows."""
+        if allowed_rows is not None or self.ivf_index is not None or self.hnsw_index is not None:
+            # Each query probes its own lists / graph path or row subset, so there is no shared product
+            return [self.search(query, top_k, min_similarity, ef_search, allowed_rows) for query in query_block]
+
+        if self.shard_pool is not None:
+            return [per_group[None] for per_group in self.shard_pool.search(query_block, top_k, min_similarity)]
+
+        if self.quantizer is not None:
+            coarse_scores = self.quantizer.score(self.codes, query_block)
+            if self.num_deleted:
+                coarse_scores[:, self.deleted] = -np.inf
+            candidates, coarse = top_k_rows_batch(coarse_scores, top_k * self.rescore_factor)
+            return [
+                self._rescore(query_candidates[np.isfinite(query_coarse)], query, top_k, min_similarity)
+                for query_candidates, query_coarse, query in zip(candidates, coarse, query_block)
+            ]
+
+        # (Q, D) x (D, N) -> (Q, N) in a single BLAS call
+        similarities = query_block @ self.vectors.T
+        if self.num_deleted:
+            similarities[:, self.deleted] = -np.inf
+
+        rows, scores = top_k_rows_batch(similarities, top_k)
+
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            keep = np.isfinite(query_scores)
+            if min_similarity > 0:
+                keep &= query_scores >= min_similarity
+            results.append((query_rows[keep], query_scores[keep]))
+
+        return results
@@ -0,0 +1,166 @@
+"""
+IVF Index: Inverted-file approximate nearest neighbour index
+
+Rows are partitioned by spherical k-means. A query is compared with the
+centroids first, and only the rows of the `nprobe` closest lists are scored,
+so the scan touches roughly nprobe / nlist of the matrix.
+
+Lists are stored CSR-style: list i owns rows[offsets[i]:offsets[i + 1]].
+"""
+from pathlib import Path
+from typing import Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IVF_FILE = "ivf.npz"
+
+# Rows assigned to centroids per matrix product
+ASSIGN_BLOCK_ROWS = 16384
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every row, computed in blocks."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_kmeans(
+    vectors: np.ndarray,
+    num_clusters: int,
+    iterations: int = 20,
+    sample_size: int = None,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Train spherical k-means centroids (cosine similarity) in NumPy.
+
+    Args:
+        vectors: Unit-normalized vectors, shape (N, D)
+        num_clusters: Number of centroids
+        iterations: Lloyd iterations
+        sample_size: Rows used for training (default: 256 per centroid)
+        seed: Random seed
+
+    Returns:
+        Unit-normalized centroids, shape (num_clusters, D)
+    """
+    rng = np.random.default_rng(seed)
+    num_clusters = min(num_clusters, len(vectors))
+
+    sample_size = min(len(vectors), sample_size or num_clusters * 256)
+    sample_rows = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), size=num_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=num_clusters)
+
+        # Re-seed empty clusters with random sample rows
+        empty = counts == 0
+        if np.any(empty):
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+
+        centroids = _normalize_rows(sums)
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted lists over k-means partitions of the embedding rows."""
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        """
+        Initialize IVF index.
+
+        Args:
+            centroids: Unit-normalized centroids, shape (nlist, D)
+            offsets: List boundaries into rows, shape (nlist + 1,)
+            rows: Row ids grouped by list, shape (N,)
+        """
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def num_rows(self) -> int:
+        return int(self.offsets[-1])
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int = None, iterations: int = 20, seed: int = 0) -> 'IVFIndex':
+        """
+        Train centroids and assign every row to its list.
+
+        Args:
+            vectors: Unit-normalized vectors, shape (N, D)
+            nlist: Number of lists (default: sqrt(N))
+            iterations: k-means iterations
+            seed: Random seed
+        """
+        # sqrt(N) lists keep each probed list large enough for nprobe=8 to reach the true neighbors
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        logger.info(f"Training IVF index with {nlist} lists on {len(vectors)} vectors")
+
+        centroids = train_kmeans(vectors, nlist, iterations=iterations, seed=seed)
+        assignments = assign_to_centroids(vectors, centroids)
+
+        rows = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        return cls(centroids, offsets.astype(np.int64), rows.astype(np.int64))
+
+    def probe(self, query_normalized: np.ndarray, nprobe: int) -> np.ndarray:
+        """
+        Row ids stored in the nprobe lists closest to the query.
+
+        Args:
+            query_normalized: Unit-normalized query, shape (D,)
+            nprobe: Number of lists to visit
+
+        Returns:
+            Sorted int64 array of candidate row ids
+        """
+        nprobe = min(nprobe, self.nlist)
+        centroid_scores = self.centroids @ query_normalized
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidates = np.concatenate([
+            self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists
+        ])
+        return np.sort(candidates)
+
+    # ==================== Persistence ====================
+
+    def save(self, index_dir: Union[str, Path]):
+        """Write the index next to the embedding vectors."""
+        np.savez(Path(index_dir) / IVF_FILE, centroids=self.centroids, offsets=self.offsets, rows=self.rows)
+
+    @classmethod
+    def load(cls, index_dir: Union[str, Path]):
+        """Load the index from an index directory (None if it was never built)."""
+        path = Path(index_dir) / IVF_FILE
+        if not path.exists():
+            return None
+
+        data = np.load(path)
+        return cls(data['centroids'], data['offsets'], data['rows'])
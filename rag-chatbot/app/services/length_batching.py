@@ -0,0 +1,103 @@
+"""
+Length Batching: Token-budgeted, length-sorted batches for the encoder
+
+A padded batch costs (batch size x longest text) tokens. Mixing short entity
+labels with 500-character chunks pads the labels up to chunk length, so most
+of the compute is spent on padding. Texts are sorted by token length and cut
+into batches whose padded size stays within a token budget, encoded, and the
+embeddings are returned in the original order.
+"""
+from typing import Callable, List
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token when the model exposes no tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def token_lengths(model, texts: List[str], cap: bool = True) -> np.ndarray:
+    """
+    Token count of each text (including special tokens).
+
+    Args:
+        model: SentenceTransformer or OnnxEncoder (uses model.tokenizer if present)
+        texts: Texts to measure
+        cap: Cap counts at the model's maximum sequence length (what the model actually sees)
+    """
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is not None:
+        lengths = np.array([len(ids) for ids in tokenizer(texts, add_special_tokens=True)['input_ids']])
+    else:
+        lengths = np.array([len(text) // CHARS_PER_TOKEN + 2 for text in texts])
+
+    max_seq_length = getattr(model, 'max_seq_length', None)
+    if cap and max_seq_length:
+        lengths = np.minimum(lengths, max_seq_length)
+    return lengths
+
+
+def length_buckets(lengths: np.ndarray, token_budget: int, max_batch_size: int = 256) -> List[np.ndarray]:
+    """
+    Group text indices into length-sorted batches.
+
+    Args:
+        lengths: Token length of every text
+        token_budget: Maximum padded tokens (batch size x longest text) per batch
+        max_batch_size: Maximum texts per batch
+
+    Returns:
+        Batches of indices into the texts
+    """
+    order = np.argsort(lengths, kind='stable')
+    batches, current = [], []
+
+    for index in order:
+        length = max(int(lengths[index]), 1)
+        # Sorted ascending, so the new text is the longest of the batch
+        if current and ((len(current) + 1) * length > token_budget or len(current) >= max_batch_size):
+            batches.append(np.array(current))
+            current = []
+        current.append(index)
+
+    if current:
+        batches.append(np.array(current))
+    return batches
+
+
+def encode_bucketed(
+    encode: Callable[[List[str]], np.ndarray],
+    texts: List[str],
+    lengths: np.ndarray,
+    token_budget: int = 8192,
+    max_batch_size: int = 256
+) -> np.ndarray:
+    """
+    Encode texts in length-sorted, token-budgeted batches.
+
+    Args:
+        encode: Encoder for one batch of texts, returns shape (len(batch), dim)
+        texts: Texts to encode
+        lengths: Token length of every text (see token_lengths)
+        token_budget: Maximum padded tokens per batch
+        max_batch_size: Maximum texts per batch
+
+    Returns:
+        Embeddings in the original text order, shape (len(texts), dim)
+    """
+    batches = length_buckets(lengths, token_budget, max_batch_size)
+
+    embeddings = None
+    for batch in batches:
+        batch_embeddings = np.asarray(encode([texts[i] for i in batch]))
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+        embeddings[batch] = batch_embeddings
+
+    if embeddings is None:
+        return np.empty((0, 0), dtype=np.float32)
+
+    logger.debug(f"Encoded {len(texts)} texts in {len(batches)} length-bucketed batches")
+    return embeddings
@@ -0,0 +1,119 @@
+"""
+Matryoshka: Reduced-dimension prefix embeddings for a first-pass scan
+
+Matryoshka-trained models put the most important information into the
+leading dimensions, so the first 128 or 256 dimensions of an embedding,
+renormalized, are a usable embedding on their own. The prefix matrix is
+scanned to find candidate rows (a 256-d float16 prefix streams 6x fewer bytes
+than the 768-d float32 vectors), and the candidates are rescored with the full
+vectors, as for the other quantizers.
+
+The mode name encodes the prefix size: 'mrl128', 'mrl256', ...
+"""
+from typing import Optional
+import logging
+
+import numpy as np
+
+from app.services.quantization import SCAN_BLOCK_ROWS, CodeQuantizer
+
+logger = logging.getLogger(__name__)
+
+PREFIX_MODE = 'mrl'
+
+
+def prefix_mode(dim: int) -> str:
+    """Quantization mode name for a prefix size."""
+    return f"{PREFIX_MODE}{dim}"
+
+
+def parse_prefix_mode(mode: Optional[str]) -> Optional[int]:
+    """Prefix size of a mode like 'mrl256', or None for other modes."""
+    if mode and mode.startswith(PREFIX_MODE) and mode[len(PREFIX_MODE):].isdigit():
+        return int(mode[len(PREFIX_MODE):])
+    return None
+
+
+def truncate_embeddings(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Keep the first dim dimensions and renormalize to unit length.
+
+    Args:
+        vectors: Embeddings, shape (D,) or (N, D)
+        dim: Prefix size
+
+    Returns:
+        Float32 prefix embeddings, shape (dim,) or (N, dim)
+    """
+    prefix = np.asarray(vectors, dtype=np.float32)[..., :dim]
+    norms = np.linalg.norm(prefix, axis=-1, keepdims=True)
+    return prefix / np.maximum(norms, 1e-12)
+
+
+class PrefixQuantizer(CodeQuantizer):
+    """Truncated, renormalized float16 prefix of every vector."""
+
+    def __init__(self, dim: int):
+        """
+        Initialize quantizer.
+
+        Args:
+            dim: Number of leading dimensions kept
+        """
+        self.dim = dim
+        self.mode = prefix_mode(dim)
+
+    @classmethod
+    def for_mode(cls, mode: str) -> 'PrefixQuantizer':
+        return cls(parse_prefix_mode(mode))
+
+    def fit(self, vectors: np.ndarray) -> 'PrefixQuantizer':
+        if self.dim >= vectors.shape[1]:
+            raise ValueError(f"Prefix size {self.dim} must be smaller than the embedding dimension {vectors.shape[1]}")
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Prefix codes, processed in blocks to bound temporary memory."""
+        codes = np.empty((len(vectors), self.dim), dtype=np.float16)
+        for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+            block = vectors[start:start + SCAN_BLOCK_ROWS]
+            codes[start:start + len(block)] = truncate_embeddings(block, self.dim)
+        return codes
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarities between prefix codes and the prefixes of float queries.
+
+        Args:
+            codes: Prefix codes, shape (N, dim)
+            queries: Full query vectors, shape (D,) or (Q, D)
+
+        Returns:
+            Scores of shape (N,) or (Q, N)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = truncate_embeddings(np.atleast_2d(queries), self.dim)
+
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = np.asarray(codes[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+
+        return scores[0] if single else scores
+
+
+def build_prefix_codes(vectors: np.ndarray, dim: int):
+    """
+    Truncate vectors to their first dim dimensions.
+
+    Returns:
+        (quantizer, codes)
+    """
+    quantizer = PrefixQuantizer(dim).fit(vectors)
+    codes = quantizer.encode(vectors)
+    logger.info(
+        f"Encoded {len(codes)} vectors as {dim}-d float16 prefixes "
+        f"({codes.nbytes / 1e6:.1f} MB, {vectors.shape[1] * 4 / (dim * 2):.1f}x smaller than float32)"
+    )
+    return quantizer, codes
@@ -0,0 +1,68 @@
+"""
+MMR: Maximal-marginal-relevance selection over retrieved candidates
+
+Greedily picks results that are relevant to the query but dissimilar to what
+was already picked:
+
+    score(i) = lambda * relevance(i) - (1 - lambda) * max_{j in picked} sim(i, j)
+
+The pairwise similarity matrix of the candidates is computed with one matrix
+product, and the "closest picked result" column is maintained incrementally,
+so each greedy step is a single vectorized argmax.
+"""
+from typing import List
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def mmr_select(
+    candidate_vectors: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    lambda_: float = 0.5
+) -> List[int]:
+    """
+    Select k diverse candidates.
+
+    Args:
+        candidate_vectors: Candidate embeddings, shape (N, D); NaN rows are never picked
+        relevance: Relevance of each candidate to the query, shape (N,)
+        k: Number of candidates to select
+        lambda_: Trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        Indices into the candidates, in selection order
+    """
+    vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    usable = ~np.isnan(vectors).any(axis=1)
+    k = min(k, int(usable.sum()))
+    if k <= 0:
+        return []
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.where(usable[:, None], vectors / np.where(norms > 0, norms, 1.0), 0.0)
+
+    # (N, N) cosine similarities between candidates
+    pairwise = vectors @ vectors.T
+
+    # Similarity of every candidate to its closest already-selected candidate
+    closest_selected = np.full(len(vectors), -np.inf, dtype=np.float32)
+    available = usable.copy()
+
+    selected = []
+    for _ in range(k):
+        redundancy = np.where(np.isfinite(closest_selected), closest_selected, 0.0)
+        scores = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        scores[~available] = -np.inf
+
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        closest_selected = np.maximum(closest_selected, pairwise[pick])
+
+    return selected
@@ -0,0 +1,225 @@
+"""
+ONNX Encoder: CPU inference of the sentence-transformer through onnxruntime
+
+export_onnx() exports the transformer of a SentenceTransformer model to ONNX
+(optionally with dynamic int8 weight quantization) next to its tokenizer.
+OnnxEncoder loads the export and reproduces the sentence-transformers
+pipeline - tokenize, transformer, mean pooling, L2 normalization - with an
+encode() method compatible with SentenceTransformer.encode, so it can stand in
+for the PyTorch model in EmbeddingService.
+
+parity_check() compares an encoder against the PyTorch embeddings already in
+embeddings.json; an export should only be used when cosine agreement holds.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime
+    from transformers import AutoTokenizer
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    onnxruntime = None
+    AutoTokenizer = None
+    ONNXRUNTIME_AVAILABLE = False
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+ONNX_CONFIG_FILE = "onnx_encoder.json"
+
+
+def export_onnx(model_name: str, output_dir: Union[str, Path], quantize: bool = True) -> Path:
+    """
+    Export a SentenceTransformer model for onnxruntime.
+
+    Args:
+        model_name: sentence-transformers model name or path
+        output_dir: Directory for the ONNX model(s), tokenizer and config
+        quantize: Also write a dynamically int8-quantized model
+
+    Returns:
+        Output directory
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device='cpu')
+    pooling = next((m for m in model if isinstance(m, Pooling)), None)
+    if pooling is None or not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"{model_name}: only mean-pooling models can be exported")
+
+    class _Transformer(torch.nn.Module):
+        """Token embeddings only; pooling runs in NumPy."""
+
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    transformer = _Transformer(model[0].auto_model).eval()
+    dummy = model.tokenizer(["An example sentence"], return_tensors='pt')
+
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dummy['input_ids'], dummy['attention_mask']),
+            str(output_dir / ONNX_MODEL_FILE),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['token_embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'token_embeddings': {0: 'batch', 1: 'sequence'}
+            },
+            opset_version=14
+        )
+    model.tokenizer.save_pretrained(str(output_dir))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            str(output_dir / ONNX_MODEL_FILE),
+            str(output_dir / ONNX_INT8_MODEL_FILE),
+            weight_type=QuantType.QInt8
+        )
+
+    with open(output_dir / ONNX_CONFIG_FILE, 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'dimension': model.get_sentence_embedding_dimension(),
+            'max_seq_length': model.max_seq_length,
+            'normalize': any(isinstance(m, Normalize) for m in model)
+        }, f, indent=2)
+
+    logger.info(f"Exported {model_name} to {output_dir} (int8: {quantize})")
+    return output_dir
+
+
+class OnnxEncoder:
+    """SentenceTransformer-compatible encoder running on onnxruntime."""
+
+    def __init__(self, model_dir: Union[str, Path], quantized: bool = True, num_threads: int = 0):
+        """
+        Load an export written by export_onnx().
+
+        Args:
+            model_dir: Export directory
+            quantized: Use the int8 model instead of the float32 one
+            num_threads: onnxruntime intra-op threads (0 = onnxruntime default)
+        """
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime is not installed (pip install onnxruntime transformers)")
+
+        model_dir = Path(model_dir)
+        with open(model_dir / ONNX_CONFIG_FILE, 'r') as f:
+            config = json.load(f)
+
+        self.model_name = config['model_name']
+        self.max_seq_length = config['max_seq_length']
+        self.normalize = config['normalize']
+        self.dimension = config['dimension']
+        self.quantized = quantized
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / model_file),
+            options,
+            providers=['CPUExecutionProvider']
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        logger.info(f"Loaded ONNX encoder: {model_dir / model_file}")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors='np'
+        )
+        attention_mask = tokens['attention_mask'].astype(np.int64)
+        token_embeddings = self.session.run(None, {
+            'input_ids': tokens['input_ids'].astype(np.int64),
+            'attention_mask': attention_mask
+        })[0]
+
+        # Mean pooling over real (non-padding) tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        if self.normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Encode texts like SentenceTransformer.encode.
+
+        Args:
+            sentences: One text or a list of texts
+            batch_size: Texts per onnxruntime call
+
+        Returns:
+            Shape (dim,) for a single text, (num_texts, dim) for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = [
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]
+        embeddings = np.concatenate(batches) if batches else np.empty((0, self.dimension), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def parity_check(encoder, texts: List[str], reference: np.ndarray) -> Dict:
+    """
+    Cosine agreement between an encoder and reference embeddings.
+
+    Args:
+        encoder: Object with encode(texts) (OnnxEncoder or SentenceTransformer)
+        texts: Texts whose reference embeddings are known
+        reference: Reference embeddings, shape (len(texts), dim)
+
+    Returns:
+        {'samples', 'mean_cosine', 'min_cosine'}
+    """
+    embeddings = np.asarray(encoder.encode(texts), dtype=np.float32)
+    reference = np.asarray(reference, dtype=np.float32)
+
+    cosines = np.sum(embeddings * reference, axis=1) / np.maximum(
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1), 1e-12
+    )
+    return {
+        'samples': len(texts),
+        'mean_cosine': float(cosines.mean()) if len(cosines) else 0.0,
+        'min_cosine': float(cosines.min()) if len(cosines) else 0.0
+    }
@@ -0,0 +1,210 @@
+"""
+Product Quantization: Sub-space codebooks for very large embedding matrices
+
+Each vector is split into `num_subspaces` contiguous sub-vectors, and every
+sub-vector is replaced by the id of its nearest centroid in a 256-entry
+codebook, so a 768-d float32 row (3 KB) becomes e.g. 96 bytes.
+
+Queries are scored with asymmetric distance computation (ADC): the query is
+kept in float32, its dot product with every centroid of every sub-space is
+precomputed once into a (num_subspaces, 256) lookup table, and a row's score
+is the sum of its table entries. Candidates are then rescored exactly, as for
+the scalar quantizers.
+
+Codebooks are trained offline with scripts/train_pq_codebooks.py.
+"""
+import logging
+
+import numpy as np
+
+from app.services.quantization import CodeQuantizer
+
+logger = logging.getLogger(__name__)
+
+PQ_MODE = 'pq'
+PQ_CODEBOOK_SIZE = 256
+
+# Rows scored against the lookup tables at a time
+ADC_BLOCK_ROWS = 65536
+
+
+def train_subspace_kmeans(
+    vectors: np.ndarray,
+    num_clusters: int = PQ_CODEBOOK_SIZE,
+    iterations: int = 20,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Train Euclidean k-means centroids for one sub-space in NumPy.
+
+    Args:
+        vectors: Sub-vectors, shape (N, d)
+        num_clusters: Codebook size
+        iterations: Lloyd iterations
+        seed: Random seed
+
+    Returns:
+        Centroids, shape (num_clusters, d)
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    # Fewer rows than centroids: repeat rows so every code is defined
+    picks = rng.choice(len(vectors), size=num_clusters, replace=len(vectors) < num_clusters)
+    centroids = vectors[picks].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest_centroids(vectors, centroids)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=num_clusters)
+
+        # Re-seed empty clusters with random rows
+        empty = counts == 0
+        if np.any(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+            counts[empty] = 1
+
+        centroids = sums / counts[:, None]
+
+    return centroids.astype(np.float32)
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for every row."""
+    # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 does not change the argmin
+    distances = np.sum(centroids ** 2, axis=1) - 2.0 * (vectors @ centroids.T)
+    return np.argmin(distances, axis=1)
+
+
+class ProductQuantizer(CodeQuantizer):
+    """Product quantizer with 256-entry codebooks and ADC scoring."""
+
+    mode = PQ_MODE
+    param_names = ('codebooks',)
+
+    def __init__(self, codebooks: np.ndarray = None):
+        """
+        Initialize quantizer.
+
+        Args:
+            codebooks: Centroids per sub-space, shape (num_subspaces, 256, sub_dim)
+        """
+        self.codebooks = codebooks
+
+    @classmethod
+    def for_mode(cls, mode: str = PQ_MODE) -> 'ProductQuantizer':
+        return cls()
+
+    @property
+    def num_subspaces(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def sub_dim(self) -> int:
+        return self.codebooks.shape[2]
+
+    def fit(
+        self,
+        vectors: np.ndarray,
+        num_subspaces: int = None,
+        sample_size: int = 65536,
+        iterations: int = 20,
+        seed: int = 0
+    ) -> 'ProductQuantizer':
+        """
+        Train one codebook per sub-space on a sample of the rows.
+
+        Args:
+            vectors: Unit-normalized vectors, shape (N, D)
+            num_subspaces: Number of sub-spaces (default: D / 8); must divide D
+            sample_size: Rows used for training
+            iterations: k-means iterations per sub-space
+            seed: Random seed
+        """
+        dim = vectors.shape[1]
+        num_subspaces = num_subspaces or max(1, dim // 8)
+        if dim % num_subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible into {num_subspaces} sub-spaces")
+        sub_dim = dim // num_subspaces
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), sample_size)
+        sample_rows = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+        logger.info(f"Training {num_subspaces} PQ codebooks (sub-dimension {sub_dim}) on {sample_size} vectors")
+        self.codebooks = np.stack([
+            train_subspace_kmeans(sample[:, m * sub_dim:(m + 1) * sub_dim], iterations=iterations, seed=seed + m)
+            for m in range(num_subspaces)
+        ])
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode rows as uint8 centroid ids, shape (N, num_subspaces)."""
+        codes = np.empty((len(vectors), self.num_subspaces), dtype=np.uint8)
+
+        for start in range(0, len(vectors), ADC_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + ADC_BLOCK_ROWS], dtype=np.float32)
+            for m in range(self.num_subspaces):
+                sub_block = block[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+                codes[start:start + len(block), m] = _nearest_centroids(sub_block, self.codebooks[m])
+
+        return codes
+
+    def lookup_tables(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Dot products of every query sub-vector with every centroid.
+
+        Args:
+            queries: Query vectors, shape (Q, D)
+
+        Returns:
+            Tables of shape (Q, num_subspaces, 256)
+        """
+        query_subs = queries.reshape(len(queries), self.num_subspaces, self.sub_dim)
+        return np.einsum('qmd,mkd->qmk', query_subs, self.codebooks)
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Approximate dot products between PQ codes and float queries (ADC).
+
+        Args:
+            codes: PQ codes, shape (N, num_subspaces)
+            queries: Query vectors, shape (D,) or (Q, D)
+
+        Returns:
+            Scores of shape (N,) or (Q, N)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+
+        tables = self.lookup_tables(queries)
+
+        scores = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), ADC_BLOCK_ROWS):
+            block = np.asarray(codes[start:start + ADC_BLOCK_ROWS])
+            block_scores = scores[:, start:start + len(block)]
+            # One table gather per sub-space: (Q, 256)[:, codes] -> (Q, rows)
+            for m in range(self.num_subspaces):
+                block_scores += tables[:, m, block[:, m]]
+
+        return scores[0] if single else scores
+
+
+def build_pq_codes(vectors: np.ndarray, num_subspaces: int = None, **fit_kwargs):
+    """
+    Train codebooks on vectors and encode them.
+
+    Returns:
+        (quantizer, codes)
+    """
+    quantizer = ProductQuantizer().fit(vectors, num_subspaces, **fit_kwargs)
+    codes = quantizer.encode(vectors)
+    logger.info(
+        f"Encoded {len(codes)} vectors with {quantizer.num_subspaces}-byte PQ codes "
+        f"({codes.nbytes / 1e6:.1f} MB, {vectors.shape[1] * 4 // quantizer.num_subspaces}x smaller than float32)"
+    )
+    return quantizer, codes
@@ -0,0 +1,170 @@
+"""
+Quantization: Compact float16 / int8 copies of the embedding matrix
+
+Quantized codes are scanned to find candidate rows, and the candidates are
+rescored against the full-precision float32 vectors. Only the codes have to
+stay resident in RAM; the float32 matrix can stay memory-mapped on disk.
+
+NumPy has no int8/float16 BLAS kernels, so codes are upcast to float32 in
+fixed-size row blocks while scanning. This keeps the temporary memory bounded;
+the gain is that 1-2 bytes per dimension are streamed instead of 4.
+"""
+from pathlib import Path
+from typing import Tuple, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ('int8', 'float16')
+
+# Rows upcast to float32 at a time while scanning codes
+SCAN_BLOCK_ROWS = 16384
+
+
+class CodeQuantizer:
+    """
+    Persistence shared by the quantizers: codes_{mode}.npy plus the arrays named
+    in param_names (if any) in quantizer_{mode}.npz.
+    """
+
+    mode: str = None
+    param_names: Tuple[str, ...] = ()
+
+    @classmethod
+    def for_mode(cls, mode: str) -> 'CodeQuantizer':
+        """Unfitted quantizer for a mode, to load parameters into."""
+        return cls(mode)
+
+    def codes_path(self, index_dir: Union[str, Path]) -> Path:
+        return Path(index_dir) / f"codes_{self.mode}.npy"
+
+    def params_path(self, index_dir: Union[str, Path]) -> Path:
+        return Path(index_dir) / f"quantizer_{self.mode}.npz"
+
+    def save(self, index_dir: Union[str, Path], codes: np.ndarray):
+        """Write codes and quantizer parameters into an index directory."""
+        np.save(self.codes_path(index_dir), codes)
+        if self.param_names:
+            np.savez(self.params_path(index_dir), **{name: getattr(self, name) for name in self.param_names})
+
+    @classmethod
+    def load(cls, index_dir: Union[str, Path], mode: str):
+        """
+        Load quantizer and codes from an index directory.
+
+        Returns:
+            (quantizer, codes), or (None, None) if the directory has no codes for this mode
+        """
+        quantizer = cls.for_mode(mode)
+        if not quantizer.codes_path(index_dir).exists():
+            return None, None
+
+        if quantizer.param_names:
+            params = np.load(quantizer.params_path(index_dir))
+            for name in quantizer.param_names:
+                setattr(quantizer, name, params[name])
+
+        # Codes are the resident copy: read them into RAM
+        codes = np.load(quantizer.codes_path(index_dir))
+        return quantizer, codes
+
+
+class ScalarQuantizer(CodeQuantizer):
+    """Per-dimension scalar quantizer (int8) or half-precision cast (float16)."""
+
+    def __init__(self, mode: str, scale: np.ndarray = None, offset: np.ndarray = None):
+        """
+        Initialize quantizer.
+
+        Args:
+            mode: 'int8' or 'float16'
+            scale: Per-dimension step size (int8 only)
+            offset: Per-dimension value of code -128 (int8 only)
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode} (expected one of {QUANTIZATION_MODES})")
+
+        self.mode = mode
+        self.scale = scale
+        self.offset = offset
+
+    @property
+    def dtype(self):
+        return np.int8 if self.mode == 'int8' else np.float16
+
+    def fit(self, vectors: np.ndarray) -> 'ScalarQuantizer':
+        """Learn per-dimension ranges (int8 only)."""
+        if self.mode == 'int8':
+            low = np.min(vectors, axis=0).astype(np.float32)
+            high = np.max(vectors, axis=0).astype(np.float32)
+            self.scale = np.maximum(high - low, 1e-12) / 255.0
+            self.offset = low
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantize vectors, processed in blocks to bound temporary memory."""
+        codes = np.empty(vectors.shape, dtype=self.dtype)
+
+        for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            if self.mode == 'int8':
+                levels = np.rint((block - self.offset) / self.scale)
+                codes[start:start + len(block)] = (np.clip(levels, 0, 255) - 128).astype(np.int8)
+            else:
+                codes[start:start + len(block)] = block.astype(np.float16)
+
+        return codes
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """
+        Approximate dot products between quantized rows and float queries.
+
+        Args:
+            codes: Quantized matrix, shape (N, D)
+            queries: Query vectors, shape (D,) or (Q, D)
+
+        Returns:
+            Scores of shape (N,) or (Q, N)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+
+        if self.mode == 'int8':
+            # q . x = q . ((c + 128) * scale + offset) = c . (q * scale) + q . (128 * scale + offset)
+            weights = queries * self.scale
+            bias = queries @ (128.0 * self.scale + self.offset)
+        else:
+            weights = queries
+            bias = np.zeros(len(queries), dtype=np.float32)
+
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = np.asarray(codes[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = weights @ block.T
+
+        scores += bias[:, None]
+
+        return scores[0] if single else scores
+
+    @property
+    def param_names(self) -> Tuple[str, ...]:
+        return ('scale', 'offset') if self.mode == 'int8' else ()
+
+
+def build_quantized_codes(vectors: np.ndarray, mode: str):
+    """
+    Fit a quantizer on vectors and encode them.
+
+    Returns:
+        (quantizer, codes)
+    """
+    quantizer = ScalarQuantizer(mode).fit(vectors)
+    codes = quantizer.encode(vectors)
+    logger.info(
+        f"Quantized {len(codes)} vectors to {mode} "
+        f"({codes.nbytes / 1e6:.1f} MB, {np.dtype(np.float32).itemsize // codes.itemsize}x smaller than float32)"
+    )
+    return quantizer, codes
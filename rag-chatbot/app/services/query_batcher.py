@@ -0,0 +1,121 @@
+"""
+Query Batcher: Dynamic micro-batching of concurrent embedding requests
+
+Concurrent /chat requests each need one query embedding. Encoding them one by
+one runs the model at batch size 1 over and over; instead, requests arriving
+within a short window are collected by a single worker thread, encoded with
+one call, and each caller's future is resolved with its own row.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """Collects texts from many threads and encodes them in batches."""
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Start the batching thread.
+
+        Args:
+            encode: Encoder for a list of texts, returns shape (len(texts), dim)
+            max_batch_size: Maximum texts per encode call
+            max_wait_ms: How long the first request of a batch waits for more
+        """
+        self.encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        # Orders submit() against close() so nothing is queued after the final drain
+        self._submit_lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the future resolves to its embedding."""
+        future = Future()
+        with self._submit_lock:
+            if self._stop.is_set():
+                future.set_exception(RuntimeError("batcher closed"))
+            else:
+                self._queue.put((text, future))
+        return future
+
+    def _collect(self) -> list:
+        """Block for one request, then gather more until the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = [item for item in self._collect() if item is not None]
+            if not batch:
+                continue
+
+            # Identical concurrent queries are encoded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                embeddings = dict(zip(texts, self.encode(texts)))
+            except Exception as e:
+                logger.error(f"Batch encode of {len(texts)} queries failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for text, future in batch:
+                future.set_result(embeddings[text])
+
+    def stats(self) -> Dict:
+        """Batch count and mean batch size."""
+        return {
+            'batches': self.batches,
+            'queries': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+    def close(self):
+        """Stop the batching thread and fail the requests it did not take."""
+        with self._submit_lock:
+            self._stop.set()
+            self._queue.put(None)
+        self._thread.join(timeout=5)
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("batcher closed"))
@@ -0,0 +1,96 @@
+"""
+Query Cache: Bounded LRU cache of query embeddings with a time-to-live
+
+Queries are keyed by their normalized text (case, whitespace and punctuation
+folded), so "What is the market size?" and "what is the market size" share
+one entry and skip the encoder.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Fold case, punctuation and whitespace of a query."""
+    text = _PUNCTUATION.sub(" ", text.casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of normalized query text -> embedding."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600.0):
+        """
+        Initialize cache.
+
+        Args:
+            max_size: Maximum number of cached queries (0 disables the cache)
+            ttl_seconds: Seconds an entry stays valid (0 = no expiry)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Cached embedding of a query, or None (counts a hit or a miss)."""
+        key = normalize_query(text)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds > 0 and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text: str, embedding: np.ndarray):
+        """Cache an embedding, evicting the least recently used entries."""
+        if self.max_size <= 0:
+            return
+
+        # Shared between callers, so never modified in place
+        embedding = np.array(embedding)
+        embedding.setflags(write=False)
+
+        with self._lock:
+            key = normalize_query(text)
+            self._entries[key] = (time.monotonic(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -2,17 +2,22 @@
 Enhanced RAG Service: Dual-source retrieval (Entities + Document Chunks)
 
 This version performs:
-1. Parallel search across entities and chunks
+1. Parallel search across entity and chunk sub-indexes
 2. Reranking and deduplication
 3. Context building from both sources
 4. Enhanced citation with chunk sources
 """
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import logging
 
+from app.services.mmr import mmr_select
+
 logger = logging.getLogger(__name__)
 
+# Candidates fetched per partition and result when MMR re-selects the top-k
+MMR_CANDIDATE_FACTOR = 3
+
 
 class RAGServiceV2:
     """Enhanced RAG service with dual-source retrieval."""
@@ -38,6 +43,44 @@ class RAGServiceV2:
         self.vector_search = vector_search_service
         self.llm = llm_service
 
+        # Separate entity / chunk sub-indexes so each source gets its own top-k,
+        # and metadata columns for pre-filtered search (entity type, source file, ...)
+        self.vector_search.reindex(
+            self._search_partitions(self.graph),
+            self.graph.get_search_metadata(),
+            context=self.graph
+        )
+
+    @staticmethod
+    def _search_partitions(graph) -> Dict[str, List[str]]:
+        """Entity / chunk embedding hashes of a graph."""
+        return {
+            'entity': list(graph.entities_by_hash.keys()),
+            'chunk': list(graph.chunks_by_hash.keys())
+        }
+
+    def swap_graph(self, graph_service):
+        """
+        Switch to a newly loaded graph and re-index the vectors against it.
+
+        The graph is published together with the vector snapshot indexed
+        against it. Each query reads that snapshot once, so requests already
+        running finish against the graph and vectors they started with. The
+        vectors are only reloaded if they changed on disk; otherwise the new
+        partitions and metadata are registered on the loaded segments.
+
+        Args:
+            graph_service: Freshly loaded GraphServiceV2 instance
+        """
+        partitions = self._search_partitions(graph_service)
+        metadata = graph_service.get_search_metadata()
+
+        if self.vector_search.index_changed():
+            self.vector_search.reload(partitions=partitions, metadata=metadata, context=graph_service)
+        else:
+            self.vector_search.reindex(partitions, metadata, context=graph_service)
+        self.graph = graph_service
+
     def query(
         self,
         user_query: str,
@@ -46,6 +89,10 @@ class RAGServiceV2:
         chunk_weight: float = 1.0,
         include_relationships: bool = True,
         min_similarity: float = 0.05,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        mmr_lambda: Optional[float] = None,
+        relationship_depth: int = 1,
         debug: bool = False
     ) -> Dict:
         """
@@ -58,6 +105,11 @@ class RAGServiceV2:
             chunk_weight: Weight for chunk results (0-2, default 1.0)
             include_relationships: Whether to include graph relationships
             min_similarity: Minimum similarity threshold
+            ef_search: HNSW search breadth (None = service default)
+            filters: Metadata filters, e.g. {'entity_type': 'company'}
+            mmr_lambda: Enable MMR selection with this relevance/diversity trade-off
+                        (1.0 = pure relevance, lower = fewer near-duplicate chunks)
+            relationship_depth: Hops traversed around retrieved entities for relationship context
             debug: Include debug information
 
         Returns:
@@ -69,45 +121,66 @@ class RAGServiceV2:
         """
         logger.info(f"Processing query: {user_query[:50]}...")
 
+        # Pin the vector generation and the graph it was indexed against for
+        # the whole request (see swap_graph)
+        snapshot = self.vector_search.snapshot()
+        graph = snapshot.context or self.graph
+
         # Step 1: Generate query embedding
         query_embedding = self.embedder.embed_query(user_query)
 
-        # Step 2: Dual-source vector search
-        search_results = self.vector_search.search(
+        # Step 2: Dual-source vector search (top-k from each sub-index;
+        # MMR needs a larger pool to choose from)
+        fetch_k = top_k * MMR_CANDIDATE_FACTOR if mmr_lambda is not None else top_k
+        search_results = self.vector_search.search_partitioned(
             query_embedding,
-            top_k=top_k * 2,  # Get more candidates for reranking
-            min_similarity=min_similarity
+            top_k=fetch_k,
+            min_similarity=min_similarity,
+            ef_search=ef_search,
+            filters=filters,
+            snapshot=snapshot
         )
 
-        # Step 3: Separate entities and chunks
-        entity_results = []
-        chunk_results = []
-
-        for hash_id, similarity in search_results:
-            node_info = self.graph.get_node_by_hash(hash_id)
-
-            if not node_info:
-                continue
+        # Step 3: Apply source weights
+        entity_results = [
+            {
+                'node': graph.get_entity_by_hash(hash_id),
+                'hash': hash_id,
+                'similarity': similarity * entity_weight,
+                'type': 'entity'
+            }
+            for hash_id, similarity in search_results['entity']
+        ]
+        chunk_results = [
+            {
+                'node': graph.get_chunk_by_hash(hash_id),
+                'hash': hash_id,
+                'similarity': similarity * chunk_weight,
+                'type': 'chunk'
+            }
+            for hash_id, similarity in search_results['chunk']
+        ]
 
-            if node_info['type'] == 'entity':
-                entity_results.append({
-                    'node': node_info['node'],
-                    'similarity': similarity * entity_weight,
-                    'type': 'entity'
-                })
-            elif node_info['type'] == 'chunk':
-                chunk_results.append({
-                    'node': node_info['node'],
-                    'similarity': similarity * chunk_weight,
-                    'type': 'chunk'
-                })
-
-        # Step 4: Combine and rerank
-        combined_results = entity_results + chunk_results
+        # Step 4: Combine and rerank (vectors appended after the graph was loaded
+        # have no node yet and are skipped)
+        combined_results = [r for r in entity_results + chunk_results if r['node'] is not None]
         combined_results.sort(key=lambda x: x['similarity'], reverse=True)
 
-        # Step 5: Take top-K after reranking
-        top_results = combined_results[:top_k]
+        # Step 5: Take top-K after reranking, or a diverse top-K with MMR
+        if mmr_lambda is not None:
+            candidate_vectors = self.vector_search.get_embeddings_by_hashes(
+                [r['hash'] for r in combined_results],
+                snapshot=snapshot
+            )
+            selected = mmr_select(
+                candidate_vectors,
+                [r['similarity'] for r in combined_results],
+                top_k,
+                mmr_lambda
+            )
+            top_results = [combined_results[i] for i in selected]
+        else:
+            top_results = combined_results[:top_k]
 
         logger.info(
             f"Retrieved {len(entity_results)} entities, "
@@ -117,7 +190,9 @@ class RAGServiceV2:
         # Step 6: Build enhanced context
         context = self._build_context(
             top_results,
-            include_relationships=include_relationships
+            include_relationships=include_relationships,
+            graph=graph,
+            relationship_depth=relationship_depth
         )
 
         # Step 7: Generate response with LLM
@@ -127,7 +202,7 @@ class RAGServiceV2:
         )
 
         # Step 8: Format sources
-        sources = self._format_sources(top_results)
+        sources = self._format_sources(top_results, graph)
 
         # Build response
         response = {
@@ -154,13 +229,20 @@ class RAGServiceV2:
                 ],
                 'context_length': len(context)
             }
+            if mmr_lambda is not None:
+                response['debug']['mmr'] = {
+                    'lambda': mmr_lambda,
+                    'candidates': len(combined_results)
+                }
 
         return response
 
     def _build_context(
         self,
         results: List[Dict],
-        include_relationships: bool
+        include_relationships: bool,
+        graph,
+        relationship_depth: int = 1
     ) -> str:
         """
         Build context from entities and chunks.
@@ -168,6 +250,8 @@ class RAGServiceV2:
         Args:
             results: List of result dicts with node info
             include_relationships: Whether to include relationships
+            graph: Graph generation the results were resolved against
+            relationship_depth: Hops traversed for relationship context
 
         Returns:
             Formatted context string
@@ -200,7 +284,7 @@ class RAGServiceV2:
 
                 # Related chunks (if any)
                 if include_relationships:
-                    chunks = self.graph.get_chunks_mentioning_entity(entity_id)
+                    chunks = graph.get_chunks_mentioning_entity(entity_id)
                     if chunks:
                         context += f"*Mentioned in {len(chunks)} document section(s)*\n\n"
 
@@ -209,7 +293,11 @@ class RAGServiceV2:
                 context += f"## Document Excerpt {i}\n"
                 context += f"**Source:** {node.get('source_file', 'Unknown')}\n"
                 context += f"**Chunk:** {node.get('chunk_index', '?')}\n"
-                context += f"**Relevance:** {similarity:.2f}\n\n"
+                context += f"**Relevance:** {similarity:.2f}\n"
+                if node.get('duplicates'):
+                    locations = [d.get('source_file') or 'Unknown' for d in node['duplicates']]
+                    context += f"*Also appears in:* {', '.join(sorted(set(locations)))}\n"
+                context += "\n"
 
                 # Chunk text
                 context += f"{node['text']}\n\n"
@@ -219,7 +307,7 @@ class RAGServiceV2:
                 if mentioned:
                     entity_labels = []
                     for entity_id in mentioned[:5]:  # Limit to 5
-                        entity = self.graph.get_entity_by_id(entity_id)
+                        entity = graph.get_entity_by_id(entity_id)
                         if entity:
                             entity_labels.append(entity.get('label', entity_id))
 
@@ -229,37 +317,43 @@ class RAGServiceV2:
 
         # Add entity relationships (if requested)
         if include_relationships and seen_entities:
-            relationship_context = self._add_relationship_context(seen_entities)
+            relationship_context = self._add_relationship_context(seen_entities, graph, relationship_depth)
             if relationship_context:
                 context += "# Entity Relationships\n\n"
                 context += relationship_context
 
         return context
 
-    def _add_relationship_context(self, entity_ids: set) -> str:
+    def _add_relationship_context(self, entity_ids: set, graph, max_depth: int = 1) -> str:
         """Add relationship information for entities."""
         context = ""
         relationships_added = 0
 
-        for entity_id in list(entity_ids)[:3]:  # Limit to 3 entities
-            entity = self.graph.get_entity_by_id(entity_id)
+        seed_ids = list(entity_ids)[:3]  # Limit to 3 entities
+
+        # One traversal for all seeds, limited to 5 related entities each
+        neighborhoods = graph.get_neighborhoods(seed_ids, max_depth=max_depth, limit_per_seed=5)
+
+        for entity_id in seed_ids:
+            entity = graph.get_entity_by_id(entity_id)
             if not entity:
                 continue
 
-            # Get related entities
-            related = self.graph.get_related_entities(entity_id, max_depth=1)
+            related = neighborhoods[entity_id]
 
             if related:
                 context += f"**{entity.get('label')}** is connected to:\n"
-                for rel_entity in related[:5]:  # Limit to 5 related
-                    context += f"- {rel_entity.get('label')} ({rel_entity.get('type')})\n"
+                for neighbor in related:
+                    rel_entity = neighbor['entity']
+                    hops = f", {neighbor['distance']} hops" if neighbor['distance'] > 1 else ""
+                    context += f"- {rel_entity.get('label')} ({rel_entity.get('type')}{hops})\n"
                     relationships_added += 1
 
                 context += "\n"
 
         return context if relationships_added > 0 else ""
 
-    def _format_sources(self, results: List[Dict]) -> List[Dict]:
+    def _format_sources(self, results: List[Dict], graph) -> List[Dict]:
         """
         Format sources for response with clean, type-specific fields.
 
@@ -296,7 +390,7 @@ class RAGServiceV2:
                 # Get mentioned entity labels
                 mentioned = []
                 for eid in node.get('mentions_entities', [])[:5]:
-                    entity = self.graph.get_entity_by_id(eid)
+                    entity = graph.get_entity_by_id(eid)
                     if entity:
                         mentioned.append(entity.get('label', eid))
 
@@ -306,7 +400,11 @@ class RAGServiceV2:
                     'source_file': node.get('source_file', 'Unknown'),
                     'chunk_index': node.get('chunk_index', 0),
                     'text_preview': preview,
-                    'mentioned_entities': mentioned if mentioned else None
+                    'mentioned_entities': mentioned if mentioned else None,
+                    'duplicate_sources': [
+                        f"{d.get('source_file')}#{d.get('chunk_index')}"
+                        for d in node.get('duplicates', [])
+                    ] or None
                 }
                 # Remove null fields
                 source = {k: v for k, v in source.items() if v is not None}
@@ -0,0 +1,252 @@
+"""
+Segments: On-disk layout of the append-only segmented vector index
+
+    <index_dir>/manifest.json          generation, base directory, segments, tombstones
+    <index_dir>/<base>/                base segment ("." for an index built by build_vector_index.py)
+    <index_dir>/segments/<name>/       append segments (EmbeddingStore files + metadata.json)
+
+Tombstones map a hash to the number of segments that existed when it was
+deleted: the hash is dead in the base segment and in segments[:n], so a hash
+re-added later in a newer segment stays live.
+
+Writers (ingestion, compaction) modify the manifest under an exclusive file
+lock and replace it atomically. Readers only ever read the manifest.
+Compaction builds its new base under a separate lock and holds the manifest
+lock only to switch to it, so ingestion is never blocked by a rebuild.
+"""
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore, HASHES_FILE, default_index_dir
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".manifest.lock"
+COMPACTION_LOCK_FILE = ".compaction.lock"
+SEGMENTS_DIR = "segments"
+SEGMENT_METADATA_FILE = "metadata.json"
+
+
+def empty_manifest() -> Dict:
+    return {
+        'generation': 0,
+        'base': '.',
+        'segments': [],
+        'next_segment': 1,
+        'deleted': {}
+    }
+
+
+def read_manifest(index_dir: PathLike) -> Dict:
+    """Read the manifest (an index without one is a bare base segment)."""
+    path = Path(index_dir) / MANIFEST_FILE
+    if not path.exists():
+        return empty_manifest()
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(index_dir: PathLike, manifest: Dict):
+    """Replace the manifest atomically."""
+    path = Path(index_dir) / MANIFEST_FILE
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _file_lock(path: Path, blocking: bool):
+    """Exclusive flock on path; yields False if non-blocking acquisition failed."""
+    with open(path, 'w') as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def manifest_lock(index_dir: PathLike, blocking: bool = True):
+    """
+    Exclusive lock for manifest writers.
+
+    Yields:
+        True if the lock is held, False if non-blocking acquisition failed
+    """
+    with _file_lock(Path(index_dir) / LOCK_FILE, blocking) as locked:
+        yield locked
+
+
+@contextmanager
+def compaction_lock(index_dir: PathLike, blocking: bool = False):
+    """
+    Exclusive lock held while a compaction builds its new base (one compactor at a time).
+
+    Yields:
+        True if the lock is held, False if non-blocking acquisition failed
+    """
+    with _file_lock(Path(index_dir) / COMPACTION_LOCK_FILE, blocking) as locked:
+        yield locked
+
+
+def base_dir(index_dir: PathLike, manifest: Dict) -> Path:
+    return Path(index_dir) / manifest['base']
+
+
+def segment_dir(index_dir: PathLike, name: str) -> Path:
+    return Path(index_dir) / SEGMENTS_DIR / name
+
+
+def resolve_index_dir(embeddings_path: PathLike) -> Optional[Path]:
+    """
+    Binary index directory to load for an embeddings path.
+
+    Returns the directory itself, or for a JSON path the sibling index as long
+    as it is at least as new as the JSON file; None means "load the JSON".
+    """
+    path = Path(embeddings_path)
+    if path.is_dir():
+        return path
+
+    index_dir = default_index_dir(path)
+    manifest_file = index_dir / MANIFEST_FILE
+    marker = manifest_file if manifest_file.exists() else index_dir / HASHES_FILE
+
+    if not marker.exists():
+        return None
+
+    if marker.stat().st_mtime < path.stat().st_mtime:
+        logger.warning(
+            f"Binary index {index_dir} is older than {path}; falling back to JSON. "
+            f"Run scripts/build_vector_index.py to rebuild it."
+        )
+        return None
+
+    return index_dir
+
+
+def load_segment_metadata(directory: PathLike) -> Dict[str, Dict]:
+    """Per-hash metadata stored next to a segment (empty if none)."""
+    path = Path(directory) / SEGMENT_METADATA_FILE
+    if not path.exists():
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_segment_metadata(directory: PathLike, metadata: Dict[str, Dict]):
+    with open(Path(directory) / SEGMENT_METADATA_FILE, 'w') as f:
+        json.dump(metadata, f)
+
+
+def append_segment(
+    index_dir: PathLike,
+    hashes: List[str],
+    embeddings: np.ndarray,
+    metadata: Optional[Dict[str, Dict]] = None
+) -> str:
+    """
+    Write new vectors as an append segment and register it in the manifest.
+
+    Hashes that already exist are superseded: older copies are tombstoned.
+
+    Args:
+        index_dir: Root index directory
+        hashes: Embedding hashes of the new rows
+        embeddings: Raw embeddings, shape (len(hashes), D)
+        metadata: Optional hash -> metadata columns for filtered search
+
+    Returns:
+        Name of the new segment
+    """
+    store = EmbeddingStore.from_arrays(hashes, embeddings)
+
+    with manifest_lock(index_dir):
+        manifest = read_manifest(index_dir)
+        name = f"seg-{manifest['next_segment']:06d}"
+
+        directory = segment_dir(index_dir, name)
+        store.save(directory)
+        save_segment_metadata(directory, metadata or {})
+
+        # Tombstone older copies of re-added hashes
+        for text_hash in hashes:
+            manifest['deleted'][str(text_hash)] = len(manifest['segments'])
+
+        manifest['segments'].append(name)
+        manifest['next_segment'] += 1
+        write_manifest(index_dir, manifest)
+
+    logger.info(f"Appended segment {name} with {len(store)} vectors")
+    return name
+
+
+def append_tombstones(index_dir: PathLike, hashes: List[str]):
+    """Mark hashes as deleted in every existing segment."""
+    with manifest_lock(index_dir):
+        manifest = read_manifest(index_dir)
+        for text_hash in hashes:
+            manifest['deleted'][str(text_hash)] = len(manifest['segments'])
+        write_manifest(index_dir, manifest)
+
+
+def reset_manifest(index_dir: PathLike):
+    """
+    Start a new generation whose base is the index directory itself.
+
+    Used after build_vector_index.py rewrites the base files in place; old
+    append segments are dropped because the rebuilt base already contains them.
+    """
+    with manifest_lock(index_dir):
+        manifest = read_manifest(index_dir)
+        stale_dirs = [segment_dir(index_dir, name) for name in manifest['segments']]
+        if manifest['base'] != '.':
+            stale_dirs.append(base_dir(index_dir, manifest))
+
+        write_manifest(index_dir, {
+            **empty_manifest(),
+            'generation': manifest['generation'] + 1,
+            'next_segment': manifest['next_segment']
+        })
+
+    for directory in stale_dirs:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def rebase_tombstones(deleted: Dict[str, int], applied: Dict[str, int], num_compacted: int) -> Dict[str, int]:
+    """
+    Tombstones for the segments left after the base and segments[:num_compacted] are compacted.
+
+    Tombstones already applied when the compacted rows were taken are baked into
+    the new base; the newer ones move down by num_compacted segments.
+    """
+    return {
+        text_hash: depth - num_compacted
+        for text_hash, depth in deleted.items()
+        if applied.get(text_hash) != depth
+    }
+
+
+def load_segment(index_dir: PathLike, name: str) -> Tuple[EmbeddingStore, Dict[str, Dict]]:
+    """Open an append segment and its metadata."""
+    directory = segment_dir(index_dir, name)
+    return EmbeddingStore.load(directory), load_segment_metadata(directory)
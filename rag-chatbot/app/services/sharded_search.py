@@ -0,0 +1,215 @@
+"""
+Sharded Search: Scatter-gather similarity scan across local worker processes
+
+The rows of a segment are split into contiguous shards. Each shard is owned by
+a single-process executor, so per-shard state (the vector slice, tombstones and
+partition rows) is loaded once and stays in that process. A query is sent to
+every shard, each shard returns its own top-k with global row ids, and the
+per-shard results are merged with one more top-k selection.
+
+Workers memory-map the vectors from the index directory when there is one, so
+the shards share the OS page cache instead of copying the matrix.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from app.services.embedding_store import VECTORS_FILE
+from app.services.topk import top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# Per-process shard state, set by _init_shard
+_shard: Dict = {}
+
+
+def _init_shard(start: int, end: int, vectors_path: Optional[str], vectors: Optional[np.ndarray]):
+    """Executor initializer: open this process's slice of the matrix."""
+    if vectors_path is not None:
+        vectors = np.load(vectors_path, mmap_mode='r')[start:end]
+
+    _shard['start'] = start
+    _shard['vectors'] = vectors
+    _shard['deleted'] = np.zeros(end - start, dtype=bool)
+    _shard['groups'] = {}
+
+
+def _set_groups(groups: Dict[str, np.ndarray]):
+    _shard['groups'] = groups
+
+
+def _delete_rows(rows: np.ndarray):
+    _shard['deleted'][rows] = True
+
+
+def _search_shard(
+    queries: np.ndarray,
+    top_k: int,
+    min_similarity: float,
+    groups: List[Optional[str]],
+    allowed_rows: Optional[np.ndarray]
+) -> List[Dict[Optional[str], Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Per-query, per-group top-k within this shard.
+
+    Args:
+        queries: Unit queries, shape (Q, D)
+        top_k: Results per query and group
+        min_similarity: Minimum similarity threshold
+        groups: Registered group names to search (None = every row)
+        allowed_rows: Optional shard-local rows every group is restricted to
+
+    Returns:
+        One dict per query: group -> (global row ids, scores)
+    """
+    start, deleted = _shard['start'], _shard['deleted']
+    empty = np.empty(0, dtype=np.int64)
+
+    scores = queries @ _shard['vectors'].T
+    if deleted.any():
+        scores[:, deleted] = -np.inf
+
+    # Candidate rows per group (None = every row)
+    candidates = {}
+    for group in groups:
+        rows = allowed_rows if group is None else _shard['groups'].get(group, empty)
+        if group is not None and allowed_rows is not None:
+            rows = np.intersect1d(rows, allowed_rows, assume_unique=True)
+        candidates[group] = rows
+
+    results = []
+    for query_scores in scores:
+        per_group = {}
+        for group, rows in candidates.items():
+            if rows is None:
+                picked, picked_scores = top_k_rows(query_scores, top_k, min_similarity)
+            else:
+                picked, picked_scores = top_k_rows(query_scores[rows], top_k, min_similarity)
+                picked = rows[picked]
+
+            # Tombstoned rows score -inf
+            keep = np.isfinite(picked_scores)
+            per_group[group] = (picked[keep] + start, picked_scores[keep])
+        results.append(per_group)
+
+    return results
+
+
+class ShardPool:
+    """Worker processes that each own a contiguous row range of one matrix."""
+
+    def __init__(self, vectors: np.ndarray, num_shards: int, index_dir: Optional[Path] = None):
+        """
+        Start one worker process per shard.
+
+        Args:
+            vectors: Unit-normalized vectors, shape (N, D)
+            num_shards: Number of shards / worker processes
+            index_dir: Directory holding vectors.npy (workers memory-map it);
+                       without one each worker receives a copy of its slice
+        """
+        num_shards = max(1, min(num_shards, len(vectors)))
+        bounds = np.linspace(0, len(vectors), num_shards + 1).astype(np.int64)
+        self.starts = bounds[:-1]
+        self.ends = bounds[1:]
+
+        vectors_path = str(Path(index_dir) / VECTORS_FILE) if index_dir is not None else None
+
+        # spawn: forking a process that runs BLAS / server threads is not safe
+        context = multiprocessing.get_context('spawn')
+        self.executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_shard,
+                initargs=(
+                    int(start),
+                    int(end),
+                    vectors_path,
+                    None if vectors_path else np.ascontiguousarray(vectors[start:end])
+                )
+            )
+            for start, end in zip(self.starts, self.ends)
+        ]
+        logger.info(f"Started {len(self.executors)} search shards over {len(vectors)} rows")
+
+    def __len__(self) -> int:
+        return len(self.executors)
+
+    def _local(self, rows: np.ndarray, shard: int) -> np.ndarray:
+        """Shard-local ids of the (sorted) global rows that fall into a shard."""
+        lo, hi = np.searchsorted(rows, [self.starts[shard], self.ends[shard]])
+        return rows[lo:hi] - self.starts[shard]
+
+    def _broadcast(self, function, per_shard_args) -> list:
+        futures = [
+            executor.submit(function, *args)
+            for executor, args in zip(self.executors, per_shard_args)
+        ]
+        return [future.result() for future in futures]
+
+    def set_groups(self, groups: Dict[str, np.ndarray]):
+        """Register named sorted row sets (e.g. partitions) in every shard."""
+        self._broadcast(_set_groups, [
+            ({name: self._local(rows, shard) for name, rows in groups.items()},)
+            for shard in range(len(self))
+        ])
+
+    def delete_rows(self, rows: np.ndarray):
+        """Propagate tombstones to the shards."""
+        rows = np.sort(rows)
+        self._broadcast(_delete_rows, [(self._local(rows, shard),) for shard in range(len(self))])
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        min_similarity: float = 0.0,
+        groups: List[Optional[str]] = (None,),
+        allowed_rows: Optional[np.ndarray] = None
+    ) -> List[Dict[Optional[str], Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Scatter queries to every shard and merge the per-shard top-k.
+
+        Args:
+            queries: Unit queries, shape (Q, D)
+            top_k: Results per query and group
+            min_similarity: Minimum similarity threshold
+            groups: Registered group names to search (None = every row)
+            allowed_rows: Optional sorted global rows every group is restricted to
+
+        Returns:
+            One dict per query: group -> (row ids, scores), sorted by score (descending)
+        """
+        groups = list(groups)
+        shard_results = self._broadcast(_search_shard, [
+            (
+                queries,
+                top_k,
+                min_similarity,
+                groups,
+                None if allowed_rows is None else self._local(allowed_rows, shard)
+            )
+            for shard in range(len(self))
+        ])
+
+        merged = []
+        for query_index in range(len(queries)):
+            per_group = {}
+            for group in groups:
+                rows = np.concatenate([result[query_index][group][0] for result in shard_results])
+                scores = np.concatenate([result[query_index][group][1] for result in shard_results])
+                picked, picked_scores = top_k_rows(scores, top_k)
+                per_group[group] = (rows[picked], picked_scores)
+            merged.append(per_group)
+
+        return merged
+
+    def close(self):
+        """Stop the worker processes."""
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,80 @@
+"""
+Top-K: Partial-sort selection helpers shared by the vector search code
+"""
+import numpy as np
+from typing import Tuple
+
+
+def top_k_rows(
+    scores: np.ndarray,
+    top_k: int,
+    min_similarity: float = 0.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the top-k scores with a partial sort.
+
+    np.argpartition finds the k best rows in O(N); only those k are sorted.
+    The threshold is applied after selection, which gives the same result as
+    filtering first because a row below the threshold can never outrank one
+    above it.
+
+    Args:
+        scores: Similarity scores, shape (N,)
+        top_k: Number of results to return
+        min_similarity: Minimum similarity threshold (ignored when <= 0)
+
+    Returns:
+        (row_indices, scores) arrays, sorted by score (descending)
+    """
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+
+    if top_k < len(scores):
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        rows = np.arange(len(scores))
+
+    top_scores = scores[rows]
+    order = np.argsort(-top_scores, kind='stable')
+    rows, top_scores = rows[order], top_scores[order]
+
+    # Filter by minimum similarity
+    if min_similarity > 0:
+        keep = top_scores >= min_similarity
+        rows, top_scores = rows[keep], top_scores[keep]
+
+    return rows, top_scores
+
+
+def top_k_rows_batch(
+    scores: np.ndarray,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the top-k scores of every row of a (Q, N) score matrix.
+
+    Args:
+        scores: Similarity scores, shape (Q, N)
+        top_k: Number of results per query
+
+    Returns:
+        (row_indices, scores) arrays of shape (Q, k), sorted per query (descending)
+    """
+    num_queries, num_rows = scores.shape
+    top_k = min(top_k, num_rows)
+    if top_k <= 0:
+        return (
+            np.empty((num_queries, 0), dtype=np.int64),
+            np.empty((num_queries, 0), dtype=scores.dtype)
+        )
+
+    if top_k < num_rows:
+        rows = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        rows = np.broadcast_to(np.arange(num_rows), scores.shape)
+
+    top_scores = np.take_along_axis(scores, rows, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
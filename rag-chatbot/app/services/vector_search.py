@@ -1,46 +1,233 @@
 """
 Vector Search Service: Perform similarity search over embeddings
+
+The index is a base segment plus append-only segments (see segments.py).
+New vectors are searchable as soon as their segment is attached, deletes are
+tombstones, and compaction periodically merges everything into a new base.
 """
-import json
+import shutil
+import threading
 import numpy as np
-from typing import List, Tuple
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 import logging
 
+from app.services.embedding_store import EmbeddingStore, write_fingerprint
+from app.services.index_segment import IndexSegment
+from app.services.segments import (
+    append_segment,
+    append_tombstones,
+    base_dir,
+    compaction_lock,
+    empty_manifest,
+    load_segment,
+    load_segment_metadata,
+    manifest_lock,
+    read_manifest,
+    rebase_tombstones,
+    resolve_index_dir,
+    save_segment_metadata,
+    segment_dir,
+    write_manifest
+)
+from app.services.topk import top_k_rows
+
 logger = logging.getLogger(__name__)
 
+# Fraction of tombstoned rows that triggers compaction
+COMPACT_DELETED_FRACTION = 0.2
+
+
+class UnknownFilterError(ValueError):
+    """A search filter names a metadata column that no segment has."""
+
+
+class IndexSnapshot(NamedTuple):
+    """One searchable state of the index, replaced as a whole."""
+    segments: Tuple[IndexSegment, ...]
+    # Metadata column -> value -> code
+    vocab: Dict[str, Dict[str, int]]
+    # What the partitions and metadata were built from (e.g. the graph)
+    context: Any = None
+
 
 class VectorSearchService:
     """Service for vector similarity search using cosine similarity."""
 
-    def __init__(self, embeddings_path: str):
+    def __init__(
+        self,
+        embeddings_path: str,
+        quantization: Optional[str] = None,
+        rescore_factor: int = 4,
+        index_type: str = 'flat',
+        nprobe: int = 8,
+        ef_search: int = 64,
+        shards: int = 0
+    ):
         """
         Initialize vector search service.
 
         Args:
-            embeddings_path: Path to embeddings.json file
+            embeddings_path: Path to embeddings.json file or a binary index directory
+            quantization: Optional coarse-scan mode ('int8', 'float16', 'pq' or a Matryoshka prefix like 'mrl256')
+            rescore_factor: Candidates per result rescored at full precision (quantized mode)
+            index_type: 'flat' (exact scan), 'ivf' (inverted file) or 'hnsw' (graph index)
+            nprobe: Inverted lists visited per query (IVF only)
+            ef_search: Default HNSW candidate list size (overridable per query)
+            shards: Worker processes scanning the base segment in parallel (flat only; 0 = in-process)
         """
         logger.info(f"Loading embeddings from {embeddings_path}")
 
-        # Load embeddings
-        with open(embeddings_path, 'r') as f:
-            embeddings_data = json.load(f)
+        self.embeddings_path = Path(embeddings_path)
+        self.index_type = index_type
+
+        # Applied to the base segment; append segments are small and scanned exactly
+        self.base_options = {
+            'quantization': quantization,
+            'rescore_factor': rescore_factor,
+            'index_type': index_type,
+            'nprobe': nprobe,
+            'ef_search': ef_search,
+            'shards': shards
+        }
+
+        # Binary index directory (None = in-memory index loaded from JSON)
+        self.index_dir = resolve_index_dir(embeddings_path)
+
+        # Partition hashes and metadata are kept so new segments can be indexed too
+        self._partition_hashes: Dict[str, List[str]] = {}
+        self._metadata: Dict[str, Dict[str, Optional[str]]] = {}
+
+        # Replaced as a whole, so a query that read it once keeps searching
+        # the same generation even if a reload swaps it
+        self._snapshot = IndexSnapshot((), {})
+        self._context = None
+        # Segments replaced by the last swap; closed at the next one
+        self._retired: List[IndexSegment] = []
+
+        # Serializes writers (add/delete/refresh/compact/reload)
+        self._write_lock = threading.RLock()
+        self._stop_maintenance = threading.Event()
+        self._maintenance_thread = None
+
+        self._load()
+
+        logger.info(f"Loaded {len(self)} embeddings with dimension {self.store.dim}")
+
+    def _load(self):
+        """(Re)load the base segment, the append segments and their tombstones."""
+        if self.index_dir is None:
+            self._source_mtime = self.embeddings_path.stat().st_mtime
+            base = IndexSegment(EmbeddingStore.from_json(self.embeddings_path))
+            base.configure(**self.base_options)
+            self._install(base, [], {}, None)
+            return
+
+        manifest = read_manifest(self.index_dir)
+        directory = base_dir(self.index_dir, manifest)
+        base = IndexSegment(EmbeddingStore.load(directory), 'base', load_segment_metadata(directory))
+        base.configure(**self.base_options)
+
+        segments = [self._open_segment(name) for name in manifest['segments']]
+        self._install(base, segments, manifest['deleted'], manifest)
+
+    def _open_segment(self, name: str) -> IndexSegment:
+        store, metadata = load_segment(self.index_dir, name)
+        return IndexSegment(store, name, metadata)
+
+    def _install(
+        self,
+        base: IndexSegment,
+        segments: List[IndexSegment],
+        deleted: Dict[str, int],
+        manifest: Optional[Dict]
+    ):
+        """Index partitions/metadata, apply tombstones and publish a new snapshot."""
+        vocab: Dict[str, Dict[str, int]] = {}
+        all_segments = [base] + segments
+        for segment in all_segments:
+            self._prepare(segment, vocab)
+        self._apply_tombstones(all_segments, deleted)
+
+        self._applied_deleted = dict(deleted)
+        self.generation = manifest['generation'] if manifest else None
+        self.base_name = manifest['base'] if manifest else None
 
-        # Convert to numpy arrays
-        self.hashes = list(embeddings_data.keys())
-        self.embeddings = np.array([embeddings_data[h] for h in self.hashes])
+        previous = self._segments
+        self._snapshot = IndexSnapshot(tuple(all_segments), vocab, self._context)
 
-        # Normalize embeddings for cosine similarity
-        # cosine_similarity(a, b) = dot(a_normalized, b_normalized)
-        norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
-        self.normalized_embeddings = self.embeddings / norms
+        # In-flight queries may still hold the previous snapshot: release its
+        # resources (shard workers) one swap later
+        for segment in self._retired:
+            segment.close()
+        self._retired = [segment for segment in previous if segment not in all_segments]
 
-        logger.info(f"Loaded {len(self.hashes)} embeddings with dimension {self.embeddings.shape[1]}")
+    def _prepare(self, segment: IndexSegment, vocab: Dict[str, Dict[str, int]]):
+        """Resolve registered partitions and metadata against a segment."""
+        segment.set_partitions(self._partition_hashes)
+        segment.set_metadata(self._metadata, vocab)
+
+    def _apply_tombstones(self, segments: List[IndexSegment], deleted: Dict[str, int]):
+        """Apply manifest tombstones: deleted[h] = n kills h in the base and segments[:n]."""
+        by_depth: Dict[int, List[str]] = {}
+        for text_hash, depth in deleted.items():
+            by_depth.setdefault(depth, []).append(text_hash)
+
+        for depth, hashes in by_depth.items():
+            for segment in segments[:depth + 1]:
+                segment.delete_hashes(hashes)
+
+    # ==================== Compatibility Views ====================
+
+    @property
+    def _segments(self) -> Tuple[IndexSegment, ...]:
+        return self._snapshot.segments
+
+    @property
+    def metadata_vocab(self) -> Dict[str, Dict[str, int]]:
+        return self._snapshot.vocab
+
+    def snapshot(self) -> IndexSnapshot:
+        """
+        Current state of the index.
+
+        Pass it to several calls (search_partitioned, get_embeddings_by_hashes, ...)
+        to make them all see the same generation.
+        """
+        return self._snapshot
+
+    def __len__(self) -> int:
+        """Number of live rows over all segments."""
+        return sum(len(s) - s.num_deleted for s in self._segments)
+
+    @property
+    def store(self) -> EmbeddingStore:
+        """Embedding store of the base segment."""
+        return self._segments[0].store
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self._segments[0].hashes
+
+    @property
+    def normalized_embeddings(self) -> np.ndarray:
+        return self._segments[0].vectors
+
+    @property
+    def num_segments(self) -> int:
+        """Append segments on top of the base."""
+        return len(self._segments) - 1
+
+    # ==================== Search ====================
 
     def search(
         self,
         query_embedding: np.ndarray,
         top_k: int = 5,
-        min_similarity: float = 0.0
+        min_similarity: float = 0.0,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        snapshot: Optional[IndexSnapshot] = None
     ) -> List[Tuple[str, float]]:
         """
         Search for most similar entities.
@@ -49,43 +236,562 @@ class VectorSearchService:
             query_embedding: Query embedding vector (768,)
             top_k: Number of results to return
             min_similarity: Minimum similarity threshold (0.0 to 1.0)
+            ef_search: HNSW candidate list size for this query (HNSW only)
+            filters: Metadata filters applied before top-k (see set_metadata)
+            snapshot: Index state to search (default: the current one)
 
         Returns:
             List of (hash, similarity_score) tuples, sorted by similarity (descending)
         """
-        # Normalize query embedding
-        query_normalized = query_embedding / np.linalg.norm(query_embedding)
+        segments, vocab, _ = snapshot or self._snapshot
+        query_normalized = self._normalize_query(query_embedding)
+        self._check_filters(segments, filters)
 
-        # Compute cosine similarities
-        similarities = np.dot(self.normalized_embeddings, query_normalized)
+        per_segment = [
+            segment.search(
+                query_normalized,
+                top_k,
+                min_similarity,
+                ef_search,
+                segment.filter_rows(filters, vocab)
+            )
+            for segment in segments
+        ]
+        return self._merge(segments, per_segment, top_k)
 
-        # Filter by minimum similarity
-        if min_similarity > 0:
-            valid_indices = np.where(similarities >= min_similarity)[0]
-            similarities = similarities[valid_indices]
-            valid_hashes = [self.hashes[i] for i in valid_indices]
-        else:
-            valid_hashes = self.hashes
+    def _merge(
+        self,
+        segments: Tuple[IndexSegment, ...],
+        per_segment: List[Tuple[np.ndarray, np.ndarray]],
+        top_k: int
+    ) -> List[Tuple[str, float]]:
+        """Merge per-segment top-k results into one global top-k, resolving hashes."""
+        hashes = np.concatenate([np.asarray(s.hashes[rows]) for s, (rows, _) in zip(segments, per_segment)])
+        scores = np.concatenate([scores for _, scores in per_segment])
+
+        picked, _ = top_k_rows(scores, top_k)
+        return [(str(hashes[i]), float(scores[i])) for i in picked]
 
-        # Get top-k indices
-        if len(similarities) == 0:
-            return []
+    def set_partitions(self, partitions: Dict[str, List[str]]):
+        """
+        Register named row partitions (e.g. entity and chunk sub-indexes).
 
-        top_k = min(top_k, len(similarities))
-        top_k_indices = np.argsort(similarities)[-top_k:][::-1]
+        Segments shipped with a 'node_type' metadata column add their rows to
+        the partition of the same name, so appended chunks are searchable
+        before the graph knows about them.
 
-        # Return results
-        results = [
-            (valid_hashes[i], float(similarities[i]))
-            for i in top_k_indices
+        Args:
+            partitions: Partition name -> embedding hashes belonging to it
+        """
+        with self._write_lock:
+            self._partition_hashes = {name: list(hashes) for name, hashes in partitions.items()}
+            for segment in self._segments:
+                segment.set_partitions(self._partition_hashes)
+
+        for name in self._partition_hashes:
+            total = sum(len(s.partition_rows[name]) for s in self._segments)
+            logger.info(f"Partition '{name}': {total} rows")
+
+    def set_metadata(self, metadata: Dict[str, Dict[str, Optional[str]]]):
+        """
+        Register per-row metadata columns for filtered search.
+
+        Each column is stored as an int32 array of category codes (-1 = missing),
+        so a filter becomes a vectorized np.isin over the column.
+
+        Args:
+            metadata: Embedding hash -> {column name: value or list of values}
+        """
+        with self._write_lock:
+            self._metadata = metadata
+            vocab: Dict[str, Dict[str, int]] = {}
+            for segment in self._segments:
+                segment.set_metadata(metadata, vocab)
+            self._snapshot = self._snapshot._replace(vocab=vocab)
+
+        logger.info(f"Metadata columns: {', '.join(f'{n} ({len(v)} values)' for n, v in self.metadata_vocab.items())}")
+
+    def reindex(
+        self,
+        partitions: Dict[str, List[str]],
+        metadata: Dict[str, Dict[str, Optional[str]]],
+        context: Any = None
+    ):
+        """
+        Re-register partitions and metadata without reloading the vectors.
+
+        Args:
+            partitions: Partition name -> embedding hashes (see set_partitions)
+            metadata: Embedding hash -> metadata columns (see set_metadata)
+            context: What they were built from, published with the new snapshot
+        """
+        with self._write_lock:
+            self._partition_hashes = {name: list(hashes) for name, hashes in partitions.items()}
+            self._metadata = metadata
+            self._context = context
+
+            vocab: Dict[str, Dict[str, int]] = {}
+            for segment in self._segments:
+                self._prepare(segment, vocab)
+            self._snapshot = IndexSnapshot(self._segments, vocab, context)
+
+        logger.info(f"Re-indexed {len(self._segments)} segments against new partitions and metadata")
+
+    def _check_filters(self, segments: Tuple[IndexSegment, ...], filters: Optional[Dict[str, Union[str, List[str]]]]):
+        """Reject filters on columns that no segment has."""
+        if not filters:
+            return
+
+        available = set()
+        for segment in segments:
+            available.update(segment.metadata_codes)
+
+        for name in filters:
+            if name not in available:
+                raise UnknownFilterError(
+                    f"Unknown filter field: {name} "
+                    f"(available: {', '.join(sorted(available)) or 'none'})"
+                )
+
+    def search_partitioned(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        min_similarity: float = 0.0,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        snapshot: Optional[IndexSnapshot] = None
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Search every registered partition for its own top-k.
+
+        Args:
+            query_embedding: Query embedding vector (768,)
+            top_k: Number of results per partition
+            min_similarity: Minimum similarity threshold (0.0 to 1.0)
+            ef_search: HNSW candidate list size for this query (HNSW only)
+            filters: Metadata filters applied before top-k (see set_metadata)
+            snapshot: Index state to search (default: the current one)
+
+        Returns:
+            Partition name -> list of (hash, similarity_score) tuples, sorted by similarity
+        """
+        segments, vocab, _ = snapshot or self._snapshot
+        query_normalized = self._normalize_query(query_embedding)
+        self._check_filters(segments, filters)
+
+        per_segment = [
+            segment.search_partitions(
+                query_normalized,
+                top_k,
+                min_similarity,
+                ef_search,
+                segment.filter_rows(filters, vocab)
+            )
+            for segment in segments
         ]
 
+        return {
+            name: self._merge(segments, [results[name] for results in per_segment], top_k)
+            for name in per_segment[0]
+        }
+
+    def search_batch(
+        self,
+        query_matrix: np.ndarray,
+        top_k: int = 5,
+        min_similarity: float = 0.0,
+        batch_size: int = 256,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        snapshot: Optional[IndexSnapshot] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search for several queries with one matrix-matrix product per batch.
+
+        Filtered queries and IVF / HNSW segments are searched query by query
+        (each query has its own candidate rows); the shared product applies to
+        unfiltered flat and quantized scans.
+
+        Args:
+            query_matrix: Query embeddings, shape (Q, 768)
+            top_k: Number of results per query
+            min_similarity: Minimum similarity threshold (0.0 to 1.0)
+            batch_size: Queries scored per matrix product (bounds the (batch, N) score matrix)
+            ef_search: HNSW candidate list size (HNSW only)
+            filters: Metadata filters applied to every query (see set_metadata)
+            snapshot: Index state to search (default: the current one)
+
+        Returns:
+            One list of (hash, similarity_score) tuples per query, in query order
+        """
+        segments, vocab, _ = snapshot or self._snapshot
+        self._check_filters(segments, filters)
+        allowed = [segment.filter_rows(filters, vocab) for segment in segments]
+
+        query_matrix = np.atleast_2d(np.asarray(query_matrix, dtype=np.float32))
+        norms = np.linalg.norm(query_matrix, axis=1, keepdims=True)
+        query_normalized = query_matrix / np.where(norms > 0, norms, 1.0)
+
+        results = []
+        for start in range(0, len(query_normalized), batch_size):
+            block = query_normalized[start:start + batch_size]
+            per_segment = [
+                segment.search_batch(block, top_k, min_similarity, ef_search, allowed_rows)
+                for segment, allowed_rows in zip(segments, allowed)
+            ]
+
+            for i in range(len(block)):
+                results.append(self._merge(segments, [rows[i] for rows in per_segment], top_k))
+
         return results
 
+    def _normalize_query(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cast a query vector to float32 and scale it to unit length."""
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        return query_embedding / np.linalg.norm(query_embedding)
+
     def get_embedding_by_hash(self, text_hash: str) -> np.ndarray:
         """Get embedding vector by hash."""
-        try:
-            idx = self.hashes.index(text_hash)
-            return self.embeddings[idx]
-        except ValueError:
+        embedding = self.get_embeddings_by_hashes([text_hash])[0]
+        if np.isnan(embedding).any():
             return None
+        return embedding
+
+    def get_embeddings_by_hashes(self, text_hashes: List[str], snapshot: Optional[IndexSnapshot] = None) -> np.ndarray:
+        """
+        Get embedding vectors for many hashes as one stacked matrix.
+
+        Args:
+            text_hashes: Embedding hashes
+            snapshot: Index state to read (default: the current one)
+
+        Returns:
+            Numpy array of shape (len(text_hashes), 768); rows of unknown hashes are NaN
+        """
+        segments = (snapshot or self._snapshot).segments
+        embeddings = np.full((len(text_hashes), segments[0].store.dim), np.nan, dtype=np.float32)
+        missing = np.arange(len(text_hashes))
+
+        # Newest segment first: it holds the live copy of a re-added hash
+        for segment in reversed(segments):
+            if not len(missing):
+                break
+            rows = segment.store.rows_for_hashes([text_hashes[i] for i in missing])
+            found = rows >= 0
+            found[found] = ~segment.deleted[rows[found]]
+
+            embeddings[missing[found]] = segment.store.raw_vectors(rows[found])
+            missing = missing[~found]
+
+        return embeddings
+
+    # ==================== Live Updates ====================
+
+    def add_embeddings(
+        self,
+        hashes: List[str],
+        embeddings: np.ndarray,
+        metadata: Optional[Dict[str, Dict[str, Optional[str]]]] = None
+    ):
+        """
+        Insert (or replace) vectors; they are searchable when this returns.
+
+        Args:
+            hashes: Embedding hashes
+            embeddings: Raw embeddings, shape (len(hashes), D)
+            metadata: Optional hash -> metadata columns (e.g. node_type, source_file)
+        """
+        if not len(hashes):
+            return
+
+        with self._write_lock:
+            if self.index_dir is not None:
+                append_segment(self.index_dir, hashes, embeddings, metadata)
+                self.refresh()
+                return
+
+            # In-memory index: older copies are tombstoned, new rows become a segment
+            segment = IndexSegment(
+                EmbeddingStore.from_arrays(hashes, embeddings),
+                f"mem-{len(self._segments):06d}",
+                metadata
+            )
+            self._prepare(segment, self.metadata_vocab)
+            for existing in self._segments:
+                existing.delete_hashes(list(hashes))
+            self._snapshot = self._snapshot._replace(segments=self._segments + (segment,))
+
+        logger.info(f"Added {len(hashes)} embeddings ({self.num_segments} segments)")
+
+    def delete_embeddings(self, hashes: List[str]) -> int:
+        """
+        Tombstone vectors so they no longer appear in results.
+
+        Args:
+            hashes: Embedding hashes to delete
+
+        Returns:
+            Number of rows deleted
+        """
+        with self._write_lock:
+            live_before = len(self)
+            if self.index_dir is not None:
+                append_tombstones(self.index_dir, hashes)
+                self.refresh()
+            else:
+                for segment in self._segments:
+                    segment.delete_hashes(list(hashes))
+            deleted = live_before - len(self)
+
+        logger.info(f"Deleted {deleted} embeddings")
+        return deleted
+
+    def refresh(self) -> bool:
+        """
+        Pick up segments, tombstones and compactions written by other processes.
+
+        Returns:
+            True if the searchable index changed
+        """
+        if self.index_dir is None:
+            # JSON mode: a rewritten embeddings.json is reloaded as a new generation
+            if self.embeddings_path.stat().st_mtime == self._source_mtime:
+                return False
+            logger.info(f"{self.embeddings_path} changed; reloading")
+            self.reload()
+            return True
+
+        with self._write_lock:
+            manifest = read_manifest(self.index_dir)
+
+            # A new generation means a new base: reload everything
+            if manifest['generation'] != self.generation or manifest['base'] != self.base_name:
+                logger.info(f"Index generation changed ({self.generation} -> {manifest['generation']}); reloading")
+                self._load()
+                return True
+
+            known = [s.name for s in self._segments[1:]]
+            new_names = manifest['segments'][len(known):]
+            new_deleted = {
+                h: depth for h, depth in manifest['deleted'].items()
+                if self._applied_deleted.get(h) != depth
+            }
+            if not new_names and not new_deleted:
+                return False
+
+            new_segments = [self._open_segment(name) for name in new_names]
+            for segment in new_segments:
+                self._prepare(segment, self.metadata_vocab)
+
+            segments = list(self._segments) + new_segments
+            self._apply_tombstones(segments, new_deleted)
+            self._applied_deleted.update(new_deleted)
+            self._snapshot = self._snapshot._replace(segments=tuple(segments))
+
+        logger.info(f"Attached {len(new_names)} segments, {len(new_deleted)} tombstones")
+        return True
+
+    def index_changed(self) -> bool:
+        """True if the vectors on disk differ from the loaded generation (beyond appended segments)."""
+        index_dir = resolve_index_dir(self.embeddings_path)
+        if index_dir != self.index_dir:
+            return True
+        if index_dir is None:
+            return self.embeddings_path.stat().st_mtime != self._source_mtime
+
+        manifest = read_manifest(index_dir)
+        return manifest['generation'] != self.generation or manifest['base'] != self.base_name
+
+    def reload(
+        self,
+        partitions: Optional[Dict[str, List[str]]] = None,
+        metadata: Optional[Dict[str, Dict[str, Optional[str]]]] = None,
+        context: Any = None
+    ):
+        """
+        Build a new index generation off to the side and swap it in atomically.
+
+        Queries already running keep the snapshot they started with; only
+        queries that start after the swap see the new generation.
+
+        Args:
+            partitions: New partition hashes (None = keep the registered ones)
+            metadata: New metadata columns (None = keep the registered ones)
+            context: Published with the new snapshot (None = keep the current one)
+        """
+        with self._write_lock:
+            if partitions is not None:
+                self._partition_hashes = {name: list(hashes) for name, hashes in partitions.items()}
+            if metadata is not None:
+                self._metadata = metadata
+            if context is not None:
+                self._context = context
+
+            # The binary index may have been built (or gone stale) since the last load
+            self.index_dir = resolve_index_dir(self.embeddings_path)
+            self._load()
+
+        logger.info(f"Reloaded {len(self)} embeddings (generation {self.generation})")
+
+    def compact(self) -> bool:
+        """
+        Merge live rows of all segments into a new base segment.
+
+        The new base and its ANN structures are built from a snapshot without
+        holding the write or manifest locks, so searches, inserts and deletes
+        continue meanwhile. The locks are taken only to switch the manifest;
+        segments and tombstones added since the snapshot stay on top of the
+        new base.
+
+        Returns:
+            True if a compaction ran
+        """
+        if self.index_dir is None:
+            with self._write_lock:
+                return self._compact_in_memory()
+
+        with compaction_lock(self.index_dir) as locked:
+            if not locked:
+                logger.info("Another compaction is running; skipping")
+                return False
+
+            # Snapshot: segments, the rows live in them and the tombstones already applied
+            with self._write_lock:
+                self.refresh()
+                segments = self._segments
+                if len(segments) == 1 and not segments[0].num_deleted:
+                    return False
+                live_rows = [s.live_rows() for s in segments]
+                applied_deleted = dict(self._applied_deleted)
+                generation, base_name = self.generation, self.base_name
+
+            name = f"base-{generation + 1:06d}"
+            directory = Path(self.index_dir) / name
+            shutil.rmtree(directory, ignore_errors=True)
+
+            logger.info(f"Compacting {len(segments)} segments into {name}")
+            EmbeddingStore.concatenate([s.store for s in segments], live_rows).save(directory)
+            save_segment_metadata(directory, self._live_metadata(segments, live_rows))
+
+            # Re-encode with the current quantizer instead of retraining it
+            quantizer = segments[0].quantizer
+            if quantizer is not None:
+                store = EmbeddingStore.load(directory)
+                quantizer.save(directory, quantizer.encode(store.vectors))
+                write_fingerprint(directory, quantizer.mode, store.fingerprint())
+
+            base = IndexSegment(EmbeddingStore.load(directory), 'base', load_segment_metadata(directory))
+            base.configure(**self.base_options)
+
+            with self._write_lock, manifest_lock(self.index_dir):
+                manifest = read_manifest(self.index_dir)
+                if manifest['generation'] != generation or manifest['base'] != base_name:
+                    logger.info("Index was rebuilt during compaction; discarding the new base")
+                    base.close()
+                    shutil.rmtree(directory, ignore_errors=True)
+                    return False
+
+                # Segments and tombstones that arrived while the base was built
+                compacted = len(segments) - 1
+                new_names = manifest['segments'][compacted:]
+                deleted = rebase_tombstones(manifest['deleted'], applied_deleted, compacted)
+
+                stale_dirs = [segment_dir(self.index_dir, s.name) for s in segments[1:]]
+                if manifest['base'] != '.':
+                    stale_dirs.append(base_dir(self.index_dir, manifest))
+
+                manifest = {
+                    **empty_manifest(),
+                    'generation': generation + 1,
+                    'base': name,
+                    'segments': new_names,
+                    'next_segment': manifest['next_segment'],
+                    'deleted': deleted
+                }
+                write_manifest(self.index_dir, manifest)
+                self._install(base, [self._open_segment(n) for n in new_names], deleted, manifest)
+
+        # Open memory maps keep removed files readable until they are dropped
+        for stale in stale_dirs:
+            shutil.rmtree(stale, ignore_errors=True)
+
+        logger.info(f"Compaction complete: {len(base)} rows in {name} (+{len(new_names)} newer segments)")
+        return True
+
+    def _compact_in_memory(self) -> bool:
+        segments = self._segments
+        if len(segments) == 1 and not segments[0].num_deleted:
+            return False
+
+        live_rows = [s.live_rows() for s in segments]
+        base = IndexSegment(
+            EmbeddingStore.concatenate([s.store for s in segments], live_rows),
+            'base',
+            self._live_metadata(segments, live_rows)
+        )
+        base.configure(**self.base_options)
+        self._install(base, [], {}, None)
+        return True
+
+    def _live_metadata(self, segments: Tuple[IndexSegment, ...], live_rows: List[np.ndarray]) -> Dict[str, Dict]:
+        """Shipped metadata of rows that survive compaction."""
+        metadata = {}
+        for segment, live in zip(segments, live_rows):
+            if not segment.metadata:
+                continue
+            is_live = np.zeros(len(segment), dtype=bool)
+            is_live[live] = True
+            hashes = list(segment.metadata)
+            rows = segment.store.rows_for_hashes(hashes)
+            for text_hash, row in zip(hashes, rows):
+                if row >= 0 and is_live[row]:
+                    metadata[text_hash] = segment.metadata[text_hash]
+        return metadata
+
+    def needs_compaction(self, max_segments: int) -> bool:
+        segments = self._segments
+        total = sum(len(s) for s in segments)
+        deleted = sum(s.num_deleted for s in segments)
+        return len(segments) - 1 > max_segments or deleted > COMPACT_DELETED_FRACTION * max(total, 1)
+
+    def start_maintenance(self, interval: float = 5.0, max_segments: int = 8):
+        """
+        Start a background thread that refreshes the index and compacts it.
+
+        Args:
+            interval: Seconds between manifest checks
+            max_segments: Append segments tolerated before compacting
+        """
+        if self._maintenance_thread is not None:
+            return
+
+        def run():
+            while not self._stop_maintenance.wait(interval):
+                try:
+                    self.refresh()
+                    if self.needs_compaction(max_segments):
+                        self.compact()
+                except Exception as e:
+                    logger.error(f"Index maintenance failed: {e}", exc_info=True)
+
+        self._maintenance_thread = threading.Thread(target=run, name="vector-index-maintenance", daemon=True)
+        self._maintenance_thread.start()
+        logger.info(f"Index maintenance every {interval}s (compaction above {max_segments} segments)")
+
+    def close(self):
+        """Stop background maintenance and shard worker processes."""
+        self.stop_maintenance()
+        with self._write_lock:
+            for segment in self._segments + tuple(self._retired):
+                segment.close()
+            self._retired = []
+
+    def stop_maintenance(self):
+        """Stop the background maintenance thread."""
+        if self._maintenance_thread is None:
+            return
+        self._stop_maintenance.set()
+        self._maintenance_thread.join()
+        self._maintenance_thread = None
+        self._stop_maintenance.clear()
@@ -10,9 +10,11 @@ This script:
 6. Updates embeddings.json with chunk embeddings
 """
 
+import sys
 import json
 import hashlib
 import re
+import time
 from pathlib import Path
 from typing import List, Dict, Tuple
 import argparse
@@ -21,20 +23,70 @@ from datetime import datetime
 # Imports for text processing and embeddings
 from sentence_transformers import SentenceTransformer
 
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.embedding_cache import DEFAULT_CACHE_PATH, EmbeddingCache
+from app.services.encode_pool import EncodePool
+from app.services.embedding_store import default_index_dir
+from app.services.length_batching import encode_bucketed, token_lengths
+from app.services.segments import append_segment
+
 
 class DocumentChunker:
     """Intelligent document chunking with context preservation."""
 
-    def __init__(self, chunk_size=500, chunk_overlap=100):
+    def __init__(self, chunk_size=500, chunk_overlap=100, tokenizer=None):
         """
         Initialize chunker.
 
         Args:
-            chunk_size: Target size in characters
-            chunk_overlap: Overlap between chunks in characters
+            chunk_size: Target size in characters (in tokens with a tokenizer)
+            chunk_overlap: Overlap between chunks in characters (in tokens with a tokenizer)
+            tokenizer: Model tokenizer; sizes chunks in tokens so none exceeds the
+                       model's sequence limit (paragraphs that do are split)
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.tokenizer = tokenizer
+
+    def _length(self, text: str) -> int:
+        """Size of text in the chunker's unit (characters or tokens)."""
+        if self.tokenizer is None:
+            return len(text)
+        return len(self.tokenizer(text, add_special_tokens=False)['input_ids'])
+
+    def _token_starts(self, text: str) -> List[int]:
+        """Character offset at which each token of text starts."""
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+        return [start for start, _ in offsets]
+
+    def _split_oversized(self, para: str) -> List[str]:
+        """Split a paragraph that cannot fit into one chunk (token mode only)."""
+        # Leave room for the overlap carried over from the previous chunk
+        limit = self.chunk_size - self.chunk_overlap
+        if self.tokenizer is None or self._length(para) <= limit:
+            return [para]
+
+        pieces, current = [], ""
+        for sentence in re.split(r'(?<=[.!?])\s+', para):
+            if self._length(sentence) > limit:
+                # A single over-long sentence: cut it at token boundaries
+                if current:
+                    pieces.append(current)
+                    current = ""
+                starts = self._token_starts(sentence)
+                cuts = starts[::limit] + [len(sentence)]
+                pieces.extend(sentence[a:b].strip() for a, b in zip(cuts, cuts[1:]))
+            elif current and self._length(current + " " + sentence) > limit:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+
+        if current:
+            pieces.append(current)
+        return [piece for piece in pieces if piece]
 
     def chunk_text(self, text: str, source_file: str) -> List[Dict]:
         """
@@ -61,52 +113,56 @@ class DocumentChunker:
             if not para:
                 continue
 
-            # If adding this paragraph exceeds chunk_size, save current chunk
-            if len(current_chunk) + len(para) > self.chunk_size and current_chunk:
-                chunks.append({
-                    "id": f"chunk_{source_file}_{chunk_id:04d}",
-                    "type": "DocumentChunk",
-                    "text": current_chunk.strip(),
-                    "source_file": source_file,
-                    "chunk_index": chunk_id,
-                    "paragraph_start": para_id - current_chunk.count('\n\n'),
-                    "char_count": len(current_chunk)
-                })
+            for piece in self._split_oversized(para):
+                # If adding this paragraph exceeds chunk_size, save current chunk
+                if current_chunk and self._length(current_chunk) + self._length(piece) > self.chunk_size:
+                    chunks.append(self._make_chunk(current_chunk, source_file, chunk_id, para_id))
 
-                # Start new chunk with overlap
-                overlap_text = self._get_overlap(current_chunk, self.chunk_overlap)
-                current_chunk = overlap_text + "\n\n" + para
-                chunk_id += 1
-            else:
-                # Add paragraph to current chunk
-                if current_chunk:
-                    current_chunk += "\n\n" + para
+                    # Start new chunk with overlap
+                    overlap_text = self._get_overlap(current_chunk, self.chunk_overlap)
+                    current_chunk = overlap_text + "\n\n" + piece
+                    chunk_id += 1
                 else:
-                    current_chunk = para
+                    # Add paragraph to current chunk
+                    if current_chunk:
+                        current_chunk += "\n\n" + piece
+                    else:
+                        current_chunk = piece
 
             para_id += 1
 
         # Add final chunk
         if current_chunk:
-            chunks.append({
-                "id": f"chunk_{source_file}_{chunk_id:04d}",
-                "type": "DocumentChunk",
-                "text": current_chunk.strip(),
-                "source_file": source_file,
-                "chunk_index": chunk_id,
-                "paragraph_start": para_id - current_chunk.count('\n\n'),
-                "char_count": len(current_chunk)
-            })
+            chunks.append(self._make_chunk(current_chunk, source_file, chunk_id, para_id))
 
         return chunks
 
+    def _make_chunk(self, text: str, source_file: str, chunk_id: int, para_id: int) -> Dict:
+        chunk = {
+            "id": f"chunk_{source_file}_{chunk_id:04d}",
+            "type": "DocumentChunk",
+            "text": text.strip(),
+            "source_file": source_file,
+            "chunk_index": chunk_id,
+            "paragraph_start": para_id - text.count('\n\n'),
+            "char_count": len(text)
+        }
+        if self.tokenizer is not None:
+            chunk["token_count"] = self._length(chunk["text"])
+        return chunk
+
     def _get_overlap(self, text: str, overlap_size: int) -> str:
-        """Get last N characters, breaking at sentence boundary."""
-        if len(text) <= overlap_size:
+        """Get last N characters (tokens with a tokenizer), breaking at sentence boundary."""
+        if overlap_size <= 0:
+            return ""
+        if self._length(text) <= overlap_size:
             return text
 
         # Try to break at sentence boundary
-        overlap_text = text[-overlap_size:]
+        if self.tokenizer is not None:
+            overlap_text = text[self._token_starts(text)[-overlap_size]:]
+        else:
+            overlap_text = text[-overlap_size:]
         sentence_break = overlap_text.rfind('. ')
 
         if sentence_break > 0:
@@ -178,7 +234,14 @@ class ChunkProcessor:
         graph_path: str,
         embeddings_path: str,
         document_path: str,
-        model_name: str = 'all-mpnet-base-v2'
+        model_name: str = 'all-mpnet-base-v2',
+        embedding_cache_path: str = None,
+        token_budget: int = 8192,
+        workers: int = 1,
+        batch_size: int = 32,
+        chunking: str = 'chars',
+        chunk_tokens: int = None,
+        chunk_overlap_tokens: int = 64
     ):
         """
         Initialize processor.
@@ -188,10 +251,19 @@ class ChunkProcessor:
             embeddings_path: Path to embeddings.json
             document_path: Path to source document (TXT)
             model_name: Sentence transformer model name
+            embedding_cache_path: SQLite embedding cache (None disables it)
+            token_budget: Padded tokens per length-sorted encode batch (0 = fixed batch_size)
+            workers: Encode processes (1 = in-process, 0 = one per 4 cores)
+            batch_size: Texts per encode batch when there is no token budget
+            chunking: 'chars' (500/100 characters) or 'tokens' (sized with the model tokenizer)
+            chunk_tokens: Token budget per chunk (default: the model's max sequence length)
+            chunk_overlap_tokens: Overlap between chunks in tokens
         """
         self.graph_path = Path(graph_path)
         self.embeddings_path = Path(embeddings_path)
         self.document_path = Path(document_path)
+        self.token_budget = token_budget
+        self.batch_size = batch_size
 
         # Load graph and embeddings
         print(f"Loading graph from {self.graph_path}")
@@ -202,12 +274,35 @@ class ChunkProcessor:
         with open(self.embeddings_path, 'r') as f:
             self.embeddings = json.load(f)
 
-        # Load embedding model
+        # Load embedding model (its tokenizer sizes chunks and detects truncation)
         print(f"Loading embedding model: {model_name}")
         self.model = SentenceTransformer(model_name)
 
+        # Parallel encoding: every worker process loads its own copy
+        self.encode_pool = None
+        if workers != 1:
+            print(f"Starting encode workers: {model_name}")
+            self.encode_pool = EncodePool(model_name, workers)
+
+        # Persistent embedding cache: only never-seen chunk texts are encoded
+        self.embedding_cache = None
+        if embedding_cache_path:
+            print(f"Opening embedding cache: {embedding_cache_path}")
+            self.embedding_cache = EmbeddingCache(embedding_cache_path, model_name)
+
         # Initialize components
-        self.chunker = DocumentChunker(chunk_size=500, chunk_overlap=100)
+        if chunking == 'tokens':
+            # Special tokens (<s>, </s>) count against the model's sequence limit
+            special_tokens = len(self.model.tokenizer("")['input_ids'])
+            chunk_size = (chunk_tokens or self.model.max_seq_length) - special_tokens
+            print(f"Chunking by tokens: {chunk_size} tokens per chunk, {chunk_overlap_tokens} overlap")
+            self.chunker = DocumentChunker(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap_tokens,
+                tokenizer=self.model.tokenizer
+            )
+        else:
+            self.chunker = DocumentChunker(chunk_size=500, chunk_overlap=100)
         self.linker = EntityLinker(self.graph['entities'])
 
     def generate_hash(self, text: str) -> str:
@@ -235,17 +330,59 @@ class ChunkProcessor:
         print("\nStep 2: Chunking document...")
         chunks = self.chunker.chunk_text(document_text, self.document_path.stem)
         print(f"  Created {len(chunks)} chunks")
-        print(f"  Average chunk size: {sum(c['char_count'] for c in chunks) / len(chunks):.0f} chars")
+
+        # Anything past max_seq_length is silently dropped by the model
+        chunk_tokens = token_lengths(self.model, [chunk['text'] for chunk in chunks], cap=False)
+        truncated = [chunk['id'] for chunk, n in zip(chunks, chunk_tokens) if n > self.model.max_seq_length]
+        print(f"  Average chunk size: {sum(c['char_count'] for c in chunks) / len(chunks):.0f} chars / "
+              f"{chunk_tokens.mean():.0f} tokens (limit {self.model.max_seq_length})")
+        if truncated:
+            print(f"  ⚠️  {len(truncated)} chunk(s) exceed the token limit and will be truncated when embedded:")
+            for chunk_id in truncated[:10]:
+                print(f"    - {chunk_id}")
+            if len(truncated) > 10:
+                print(f"    ... and {len(truncated) - 10} more (use --chunking tokens)")
 
         # Generate embeddings
         print("\nStep 3: Generating embeddings...")
         chunk_texts = [chunk['text'] for chunk in chunks]
-        embeddings = self.model.encode(
-            chunk_texts,
-            show_progress_bar=True,
-            batch_size=32
-        )
-        print(f"  Generated {len(embeddings)} embeddings")
+
+        encode_stats = {'texts': 0, 'seconds': 0.0}
+
+        def encode(texts):
+            start = time.time()
+            if self.encode_pool is not None:
+                result = self.encode_pool.encode(texts, self.batch_size, token_budget=self.token_budget)
+            elif self.token_budget <= 0:
+                result = self.model.encode(texts, show_progress_bar=True, batch_size=self.batch_size)
+            else:
+                # Length-sorted batches: short chunks are not padded to the longest one
+                result = encode_bucketed(
+                    lambda batch: self.model.encode(batch, batch_size=len(batch)),
+                    texts,
+                    token_lengths(self.model, texts),
+                    self.token_budget
+                )
+            encode_stats['texts'] += len(texts)
+            encode_stats['seconds'] += time.time() - start
+            return result
+
+        if self.embedding_cache is None:
+            embeddings = encode(chunk_texts)
+            print(f"  Generated {len(embeddings)} embeddings")
+        else:
+            embeddings = self.embedding_cache.get_or_compute(chunk_texts, encode)
+            cache_stats = self.embedding_cache.stats()
+            print(f"  Generated {len(embeddings)} embeddings "
+                  f"({cache_stats['hits']} from cache, {cache_stats['misses']} encoded)")
+
+        workers = self.encode_pool.num_workers if self.encode_pool is not None else 1
+        texts_per_second = encode_stats['texts'] / encode_stats['seconds'] if encode_stats['seconds'] > 0 else 0.0
+        print(f"  Encoded {encode_stats['texts']} texts with {workers} worker(s) "
+              f"in {encode_stats['seconds']:.2f}s ({texts_per_second:.1f} texts/s)")
+        if self.encode_pool is not None:
+            self.encode_pool.close()
+            self.encode_pool = None
 
         # Add embeddings to chunks and embeddings dict
         print("\nStep 4: Adding embedding hashes...")
@@ -331,11 +468,35 @@ class ChunkProcessor:
         with open(self.embeddings_path, 'w') as f:
             json.dump(self.embeddings, f)
 
+        # Append the new vectors to the binary index (picked up live by the API)
+        index_dir = default_index_dir(self.embeddings_path)
+        if index_dir.exists():
+            chunk_hashes = [chunk['embedding_hash'] for chunk in chunks]
+            segment = append_segment(
+                index_dir,
+                chunk_hashes,
+                embeddings,
+                {
+                    chunk['embedding_hash']: {
+                        'node_type': 'chunk',
+                        'source_file': chunk['source_file']
+                    }
+                    for chunk in chunks
+                }
+            )
+            print(f"  Appended segment {segment} to binary index: {index_dir}")
+
         # Statistics
         stats = {
             'document': self.document_path.name,
             'chunks_created': len(chunks),
             'embeddings_generated': len(chunks),
+            'truncated_chunks': len(truncated),
+            'encode_workers': workers,
+            'encode_batching': (
+                f"token budget {self.token_budget}" if self.token_budget > 0 else f"batch size {self.batch_size}"
+            ),
+            'encode_texts_per_second': round(texts_per_second, 1),
             'entity_links': total_links,
             'relationships_created': len(new_relationships),
             'total_graph_nodes': len(self.graph['entities']) + len(self.graph['chunks']),
@@ -348,7 +509,10 @@ class ChunkProcessor:
         print(f"\nStatistics:")
         print(f"  Document: {stats['document']}")
         print(f"  Chunks created: {stats['chunks_created']}")
+        print(f"  Truncated chunks: {stats['truncated_chunks']}")
         print(f"  Entity links: {stats['entity_links']}")
+        print(f"  Encoding: {stats['encode_workers']} worker(s), {stats['encode_batching']}, "
+              f"{stats['encode_texts_per_second']} texts/s")
         print(f"  Total graph nodes: {stats['total_graph_nodes']}")
         print(f"  Total embeddings: {stats['total_embeddings']}")
         print(f"\nBackups created:")
@@ -386,6 +550,49 @@ def main():
         default='all-mpnet-base-v2',
         help='Sentence transformer model name'
     )
+    parser.add_argument(
+        '--embedding-cache',
+        type=str,
+        default=DEFAULT_CACHE_PATH,
+        help='SQLite embedding cache (empty string disables it)'
+    )
+    parser.add_argument(
+        '--token-budget',
+        type=int,
+        default=8192,
+        help='Padded tokens per length-sorted encode batch (0 = fixed --batch-size batches)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Encode processes (1 = in-process, 0 = one per 4 cores)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=32,
+        help='Texts per encode batch (without a token budget)'
+    )
+    parser.add_argument(
+        '--chunking',
+        type=str,
+        choices=['chars', 'tokens'],
+        default='chars',
+        help='Size chunks in characters (500/100) or in model tokens'
+    )
+    parser.add_argument(
+        '--chunk-tokens',
+        type=int,
+        default=None,
+        help='Tokens per chunk with --chunking tokens (default: model max sequence length)'
+    )
+    parser.add_argument(
+        '--chunk-overlap-tokens',
+        type=int,
+        default=64,
+        help='Overlap between chunks in tokens with --chunking tokens'
+    )
 
     args = parser.parse_args()
 
@@ -394,7 +601,14 @@ def main():
         graph_path=args.graph,
         embeddings_path=args.embeddings,
         document_path=args.document,
-        model_name=args.model
+        model_name=args.model,
+        embedding_cache_path=args.embedding_cache or None,
+        token_budget=args.token_budget,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunking=args.chunking,
+        chunk_tokens=args.chunk_tokens,
+        chunk_overlap_tokens=args.chunk_overlap_tokens
     )
 
     stats = processor.process_document()
@@ -0,0 +1,213 @@
+"""
+Script to build the binary vector index from embeddings.json.
+
+This script:
+1. Loads embeddings.json (hash -> list of floats)
+2. Normalizes the vectors and converts them to float32
+3. Writes vectors.npy, norms.npy and hashes.npy to an index directory
+   (optionally collapsing near-duplicate chunks into one representative row)
+4. Optionally writes int8 / float16 codes or Matryoshka prefixes for quantized search
+5. Optionally trains an IVF (k-means partitioned) index
+6. Optionally builds or extends an HNSW graph index
+
+VectorSearchService memory-maps the index directory instead of parsing the
+JSON file, as long as the index is at least as new as embeddings.json.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.embedding_store import (
+    convert_json_to_binary, default_index_dir, EmbeddingStore, read_fingerprint, write_fingerprint
+)
+from app.services.segments import reset_manifest
+from app.services.chunk_dedup import CHUNK_GROUPS_FILE, collapse_chunk_duplicates, save_chunk_groups
+from app.services.quantization import QUANTIZATION_MODES, build_quantized_codes
+from app.services.matryoshka import build_prefix_codes
+from app.services.ivf_index import IVFIndex
+from app.services.hnsw_index import HNSWIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the binary vector index from embeddings.json'
+    )
+    parser.add_argument(
+        '--embeddings',
+        type=str,
+        default='../output/ontology/market research/embeddings/embeddings.json',
+        help='Path to embeddings.json'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        default=None,
+        help='Index directory (default: embeddings.index next to embeddings.json)'
+    )
+
+    parser.add_argument(
+        '--dedup-chunks',
+        action='store_true',
+        help='Collapse near-duplicate chunk embeddings into one representative row'
+    )
+    parser.add_argument(
+        '--dedup-threshold',
+        type=float,
+        default=0.95,
+        help='Minimum cosine similarity for two chunks to be collapsed'
+    )
+    parser.add_argument(
+        '--graph',
+        type=str,
+        default='../output/ontology/market research/graph.json',
+        help='Path to graph.json (chunk source locations for --dedup-chunks)'
+    )
+
+    parser.add_argument(
+        '--quantize',
+        type=str,
+        choices=QUANTIZATION_MODES,
+        action='append',
+        default=[],
+        help='Also write quantized codes (repeatable)'
+    )
+    parser.add_argument(
+        '--matryoshka-dim',
+        type=int,
+        action='append',
+        default=[],
+        help='Also write truncated prefix codes with this many dimensions (repeatable)'
+    )
+
+    parser.add_argument(
+        '--ivf',
+        action='store_true',
+        help='Also train an IVF index'
+    )
+    parser.add_argument(
+        '--ivf-lists',
+        type=int,
+        default=None,
+        help='Number of IVF lists (default: sqrt(N)). With VECTOR_NPROBE=8, recall@10 is close to 1.0 on '
+             'clustered embeddings and about 0.5 on unclustered data; more lists need a higher nprobe'
+    )
+
+    parser.add_argument(
+        '--hnsw',
+        action='store_true',
+        help='Also build an HNSW index (extends an existing one if only rows were appended)'
+    )
+    parser.add_argument(
+        '--hnsw-m',
+        type=int,
+        default=16,
+        help='HNSW graph degree M'
+    )
+    parser.add_argument(
+        '--hnsw-ef-construction',
+        type=int,
+        default=200,
+        help='HNSW candidate list size while building'
+    )
+    parser.add_argument(
+        '--hnsw-backend',
+        type=str,
+        choices=['auto', 'hnswlib', 'numpy'],
+        default='auto',
+        help='HNSW implementation (auto uses hnswlib when installed)'
+    )
+
+    args = parser.parse_args()
+
+    # Conversion removes the old HNSW graph; keep it in case only rows were appended
+    previous_hnsw, previous_fingerprint = None, None
+    if args.hnsw:
+        output_dir = Path(args.output) if args.output else default_index_dir(args.embeddings)
+        previous_hnsw = HNSWIndex.load(output_dir)
+        previous_fingerprint = read_fingerprint(output_dir, 'hnsw')
+
+    print(f"Converting embeddings: {args.embeddings}")
+    start = time.time()
+    index_dir = convert_json_to_binary(args.embeddings, args.output)
+    # The rebuilt base already contains every append segment
+    reset_manifest(index_dir)
+    print(f"  Wrote index to {index_dir} in {time.time() - start:.2f}s")
+
+    groups_path = index_dir / CHUNK_GROUPS_FILE
+    if args.dedup_chunks:
+        print(f"\nCollapsing near-duplicate chunks (threshold {args.dedup_threshold})...")
+        start = time.time()
+        with open(args.graph, 'r') as f:
+            chunks = json.load(f).get('chunks', [])
+
+        collapsed, chunk_groups = collapse_chunk_duplicates(
+            EmbeddingStore.load(index_dir, mmap=False), chunks, args.dedup_threshold
+        )
+        collapsed.save(index_dir)
+        save_chunk_groups(index_dir, chunk_groups)
+        members = sum(len(group) for group in chunk_groups.values())
+        print(f"  {members} chunks -> {len(chunk_groups)} representatives in {time.time() - start:.2f}s")
+    elif groups_path.exists():
+        # Groups from an earlier --dedup-chunks build no longer match the rows
+        groups_path.unlink()
+
+    store = EmbeddingStore.load(index_dir)
+    fingerprint = store.fingerprint()
+    print(f"  Vectors: {len(store)}")
+    print(f"  Dimension: {store.dim}")
+
+    for mode in args.quantize:
+        print(f"\nQuantizing to {mode}...")
+        quantizer, codes = build_quantized_codes(store.vectors, mode)
+        quantizer.save(index_dir, codes)
+        write_fingerprint(index_dir, quantizer.mode, fingerprint)
+        print(f"  Wrote {quantizer.codes_path(index_dir)} ({codes.nbytes / 1e6:.1f} MB)")
+
+    for dim in args.matryoshka_dim:
+        print(f"\nTruncating to {dim}-d Matryoshka prefixes...")
+        quantizer, codes = build_prefix_codes(store.vectors, dim)
+        quantizer.save(index_dir, codes)
+        write_fingerprint(index_dir, quantizer.mode, fingerprint)
+        print(f"  Wrote {quantizer.codes_path(index_dir)} ({codes.nbytes / 1e6:.1f} MB)")
+
+    if args.ivf:
+        print(f"\nTraining IVF index...")
+        start = time.time()
+        ivf_index = IVFIndex.build(store.vectors, nlist=args.ivf_lists)
+        ivf_index.save(index_dir)
+        write_fingerprint(index_dir, 'ivf', fingerprint)
+        print(f"  Trained {ivf_index.nlist} lists in {time.time() - start:.2f}s")
+
+    if args.hnsw:
+        print(f"\nBuilding HNSW index...")
+        start = time.time()
+        hnsw_index = previous_hnsw
+        if (
+            hnsw_index is None
+            or len(hnsw_index) > len(store)
+            or previous_fingerprint != store.fingerprint(len(hnsw_index))
+        ):
+            hnsw_index = HNSWIndex.build(
+                store.vectors,
+                M=args.hnsw_m,
+                ef_construction=args.hnsw_ef_construction,
+                backend=args.hnsw_backend
+            )
+        else:
+            print(f"  Extending existing index ({len(hnsw_index)} rows)")
+            hnsw_index.add_items(store.vectors)
+        hnsw_index.save(index_dir)
+        write_fingerprint(index_dir, 'hnsw', fingerprint)
+        print(f"  Indexed {len(hnsw_index)} vectors ({hnsw_index.backend}) in {time.time() - start:.2f}s")
+
+    print(f"\n✅ Done! Set EMBEDDINGS_PATH to the index directory or keep pointing at embeddings.json.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Script to export the embedding model for the ONNX Runtime backend.
+
+This script:
+1. Exports the sentence-transformer to ONNX (plus a dynamic int8 model)
+2. Re-embeds a sample of document chunks from graph.json with the export
+3. Compares them with the PyTorch embeddings stored in embeddings.json
+4. Fails if cosine agreement drops below --min-cosine
+
+Start the API with EMBEDDING_BACKEND=onnx-int8 (or onnx) and
+EMBEDDING_ONNX_DIR pointing at the output directory afterwards.
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.embedding_store import EmbeddingStore
+from app.services.onnx_encoder import OnnxEncoder, export_onnx, parity_check
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export the embedding model to ONNX and check parity with embeddings.json'
+    )
+    parser.add_argument(
+        '--model',
+        type=str,
+        default='sentence-transformers/all-mpnet-base-v2',
+        help='Sentence transformer model name'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        default='../output/ontology/.cache/onnx/all-mpnet-base-v2',
+        help='Export directory'
+    )
+    parser.add_argument(
+        '--no-quantize',
+        action='store_true',
+        help='Skip the int8 model'
+    )
+    parser.add_argument(
+        '--graph',
+        type=str,
+        default='../output/ontology/market research/graph.json',
+        help='Path to graph.json (chunk texts for the parity check)'
+    )
+    parser.add_argument(
+        '--embeddings',
+        type=str,
+        default='../output/ontology/market research/embeddings/embeddings.json',
+        help='Path to embeddings.json (reference PyTorch embeddings)'
+    )
+    parser.add_argument(
+        '--samples',
+        type=int,
+        default=256,
+        help='Chunks re-embedded for the parity check'
+    )
+    parser.add_argument(
+        '--min-cosine',
+        type=float,
+        default=0.99,
+        help='Minimum cosine similarity to the reference embedding for every sample'
+    )
+
+    args = parser.parse_args()
+
+    print(f"Exporting {args.model} to {args.output}")
+    start = time.time()
+    export_onnx(args.model, args.output, quantize=not args.no_quantize)
+    print(f"  Exported in {time.time() - start:.2f}s")
+
+    print(f"\nLoading parity samples...")
+    with open(args.graph, 'r') as f:
+        chunks = [c for c in json.load(f).get('chunks', []) if c.get('embedding_hash')]
+    store = EmbeddingStore.from_json(args.embeddings)
+
+    rows = store.rows_for_hashes([c['embedding_hash'] for c in chunks])
+    samples = [(c['text'], row) for c, row in zip(chunks, rows) if row >= 0][:args.samples]
+    if not samples:
+        print("  ❌ No chunk with a stored embedding found - cannot check parity")
+        sys.exit(1)
+    texts = [text for text, _ in samples]
+    reference = np.asarray(store.vectors[[row for _, row in samples]])
+    print(f"  Samples: {len(texts)}")
+
+    failed = False
+    for quantized in ([False] if args.no_quantize else [False, True]):
+        encoder = OnnxEncoder(args.output, quantized=quantized)
+        start = time.time()
+        parity = parity_check(encoder, texts, reference)
+        elapsed = time.time() - start
+
+        name = 'int8' if quantized else 'float32'
+        ok = parity['min_cosine'] >= args.min_cosine
+        failed |= not ok
+        print(f"\n{'✅' if ok else '❌'} {name}: mean cosine {parity['mean_cosine']:.5f}, "
+              f"min cosine {parity['min_cosine']:.5f} ({elapsed / len(texts) * 1000:.1f} ms/text)")
+
+    if failed:
+        print(f"\nParity below {args.min_cosine} - keep EMBEDDING_BACKEND=torch for that model.")
+        sys.exit(1)
+
+    print(f"\n✅ Done! Set EMBEDDING_BACKEND=onnx-int8 and EMBEDDING_ONNX_DIR={args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Script to train product-quantization codebooks for the binary vector index.
+
+This script:
+1. Opens the base segment of a binary index directory
+2. Trains one 256-entry codebook per sub-space on a sample of the vectors
+3. Encodes every vector as PQ codes (one byte per sub-space)
+4. Writes codes_pq.npy and quantizer_pq.npz next to the vectors
+
+Run it offline after build_vector_index.py (or after add_document_chunks.py
+has grown the corpus), then start the API with VECTOR_QUANTIZATION=pq.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.embedding_store import EmbeddingStore, default_index_dir, write_fingerprint
+from app.services.product_quantization import build_pq_codes
+from app.services.segments import base_dir, read_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Train PQ codebooks and encode the binary vector index'
+    )
+    parser.add_argument(
+        '--embeddings',
+        type=str,
+        default='../output/ontology/market research/embeddings/embeddings.json',
+        help='Path to embeddings.json (its embeddings.index directory is used)'
+    )
+    parser.add_argument(
+        '--index',
+        type=str,
+        default=None,
+        help='Index directory (default: embeddings.index next to embeddings.json)'
+    )
+    parser.add_argument(
+        '--subspaces',
+        type=int,
+        default=None,
+        help='Number of sub-spaces / bytes per vector (default: dimension / 8)'
+    )
+    parser.add_argument(
+        '--sample-size',
+        type=int,
+        default=65536,
+        help='Vectors sampled for codebook training'
+    )
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=20,
+        help='k-means iterations per sub-space'
+    )
+
+    args = parser.parse_args()
+
+    index_dir = Path(args.index) if args.index else default_index_dir(args.embeddings)
+    directory = base_dir(index_dir, read_manifest(index_dir))
+
+    print(f"Loading index: {directory}")
+    store = EmbeddingStore.load(directory)
+    print(f"  Vectors: {len(store)}")
+    print(f"  Dimension: {store.dim}")
+
+    print(f"\nTraining codebooks...")
+    start = time.time()
+    quantizer, codes = build_pq_codes(
+        store.vectors,
+        args.subspaces,
+        sample_size=args.sample_size,
+        iterations=args.iterations
+    )
+    quantizer.save(directory, codes)
+    write_fingerprint(directory, quantizer.mode, store.fingerprint())
+    print(f"  Trained {quantizer.num_subspaces} codebooks in {time.time() - start:.2f}s")
+    print(f"  Wrote {quantizer.codes_path(directory)} ({codes.nbytes / 1e6:.1f} MB)")
+
+    # Reconstruction quality of the ADC scores on a few rows
+    sample = np.asarray(store.vectors[:min(len(store), 256)])
+    approx = quantizer.score(codes[:len(sample)], sample)
+    exact = sample @ sample.T
+    print(f"  Mean |ADC - exact| score error: {np.mean(np.abs(approx - exact)):.4f}")
+
+    print(f"\n✅ Done! Set VECTOR_QUANTIZATION=pq to search with the PQ codes.")
+
+
+if __name__ == "__main__":
+    main()